@@ -1,27 +1,91 @@
 import psycopg2
 from contextlib import contextmanager
-from typing import Dict
+from typing import Dict, Any, Sequence
+import hashlib
+import re
+import threading
+import time
+import weakref
+
+# Server-side prepared statements kept per connection; past this, queries just run unprepared
+MAX_PREPARED_PER_CONNECTION = 100
 
 
 class DBConnection:
-    def __init__(self, db_config: Dict[str, str]):
+    def __init__(self, db_config: Dict[str, str], min_size: int = 1, max_size: int = 10,
+                 health_check_interval: float = 30):
         """
-        Manages the database connection.
+        Manages a thread-safe pool of database connections.
+        Each cursor() checks out its own connection, so concurrent requests don't share a transaction.
+        Connections opened under load stay open (up to max_size), along with their prepared statements.
         Args:
             db_config: A dictionary containing database connection parameters.
+            min_size: Connections opened up front.
+            max_size: Upper bound of connections; callers wait when all of them are checked out.
+            health_check_interval: Seconds a connection may sit idle before it's pinged on checkout.
         """
         self.db_config = db_config
-        self.conn = None
+        self.min_size = min_size
+        self.max_size = max(min_size, max_size)
+        self.health_check_interval = health_check_interval
+        self._connected = False
+        self._idle = []  # Connections ready to be checked out, most recently returned last
+        self._open = 0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        # Keyed by the connection object itself: an id() can be reused by the next connection
+        # once a closed one is freed, which would make us EXECUTE statements it never prepared
+        self._last_used = weakref.WeakKeyDictionary()  # conn -> time it was returned to the pool
+        self._prepared = weakref.WeakKeyDictionary()  # conn -> names of the statements PREPAREd on it
+        self._stats = {"checkouts": 0, "in_use": 0, "waits": 0, "reconnects": 0, "failed_health_checks": 0,
+                       "statements_prepared": 0, "prepared_executions": 0}
 
     def connect(self):
-        if not self.conn:
-            self.conn = psycopg2.connect(**self.db_config)
+        with self._lock:
+            if self._connected:
+                return
+            self._connected = True
+        try:
+            for _ in range(self.min_size):
+                conn = self._open_connection()
+                with self._lock:
+                    self._idle.append(conn)
+        except psycopg2.Error:
+            self.close()
+            raise
 
     def close(self):
-        if self.conn:
-            self.conn.close()
-            self.conn = None
+        """Closes the idle connections; connections checked out are closed when they come back"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._connected = False
+        for conn in idle:
+            self._discard(conn)
 
+    @contextmanager
+    def connection(self):
+        """
+        Checks out a healthy connection for the duration of the block.
+        Connections that failed with an OperationalError are dropped instead of being reused.
+        """
+        self.connect()
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["waits"] += 1
+            self._slots.acquire()
+
+        conn = None
+        broken = False
+        try:
+            conn = self._checkout()
+            yield conn
+        except psycopg2.OperationalError:
+            broken = True
+            raise
+        finally:
+            if conn is not None:
+                self._checkin(conn, broken)
+            self._slots.release()
 
     @contextmanager
     def cursor(self):
@@ -30,13 +94,130 @@ class DBConnection:
         Ensures the connection is established and commits/rollbacks transactions.
         It's used within "with ... as ... " clauses, hence the need for @contextmanager
         """
-        self.connect()
-        cursor = self.conn.cursor()
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                yield cursor
+                conn.commit()
+            except Exception as e:
+                if not conn.closed:
+                    conn.rollback()
+                raise e
+            finally:
+                cursor.close()
+
+    def execute_prepared(self, cursor, query: str, params: Sequence[Any]) -> None:
+        """
+        Runs a %s-style query as a server-side prepared statement.
+        The statement is PREPAREd the first time a pooled connection sees this query text
+        and EXECUTEd afterwards, so Postgres skips parsing and planning on repeat searches.
+        Args:
+            cursor: A cursor from cursor().
+            query: The query, with %s placeholders only (no literal %).
+            params: Values for the placeholders.
+        """
+        name = "stmt_" + hashlib.sha1(query.encode()).hexdigest()[:16]
+        prepared = self._prepared.setdefault(cursor.connection, set())
+
+        if name not in prepared:
+            if len(prepared) >= MAX_PREPARED_PER_CONNECTION:
+                cursor.execute(query, params)
+                return
+            counter = iter(range(1, len(params) + 1))
+            numbered = re.sub(r'%s', lambda _: f"${next(counter)}", query)
+            cursor.execute(f"PREPARE {name} AS {numbered}")
+            prepared.add(name)
+            with self._lock:
+                self._stats["statements_prepared"] += 1
+
+        placeholders = ', '.join(['%s'] * len(params))
+        cursor.execute(f"EXECUTE {name} ({placeholders})" if params else f"EXECUTE {name}", params)
+        with self._lock:
+            self._stats["prepared_executions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool statistics (sizes and counters since startup)"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["min_size"] = self.min_size
+            stats["max_size"] = self.max_size
+            stats["open"] = self._open
+            stats["idle"] = len(self._idle)
+        return stats
+
+    def _checkout(self):
+        """
+        Gets a healthy connection: idle ones are tried until one passes its check (the ones that
+        fail are closed), and a new one is opened once none are left.
+        """
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._open_connection()
+                break
+            if self._is_healthy(conn):
+                break
+            with self._lock:
+                self._stats["failed_health_checks"] += 1
+                self._stats["reconnects"] += 1
+            self._discard(conn)
+            self._suspect_idle()
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+        return conn
+
+    def _checkin(self, conn, broken: bool):
+        with self._lock:
+            self._stats["in_use"] -= 1
+            if broken:
+                self._stats["reconnects"] += 1
+        if broken:
+            self._suspect_idle()
+        if broken or conn.closed or not self._connected:
+            self._discard(conn)
+        else:
+            self._last_used[conn] = time.monotonic()
+            with self._lock:
+                self._idle.append(conn)
+
+    def _open_connection(self):
+        conn = psycopg2.connect(**self.db_config)
+        with self._lock:
+            self._open += 1
+        return conn
+
+    def _discard(self, conn):
+        self._last_used.pop(conn, None)
+        self._prepared.pop(conn, None)
         try:
-            yield cursor
-            self.conn.commit()
-        except Exception as e:
-            self.conn.rollback()
-            raise e
-        finally:
-            cursor.close()
\ No newline at end of file
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._lock:
+            self._open -= 1
+
+    def _suspect_idle(self):
+        """
+        One connection broke (e.g. the server restarted), so the idle ones probably did too:
+        they're pinged on their next checkout however recently they were used.
+        """
+        with self._lock:
+            idle = list(self._idle)
+        for conn in idle:
+            self._last_used.pop(conn, None)
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(conn)
+        if last_used is not None and time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
@@ -1,4 +1,10 @@
-from typing import List, Dict
+from typing import List, Dict, Iterable, Tuple, Callable, Optional
+import datetime
+import io
+import os
+from psycopg2.extras import execute_values
+
+DEFAULT_BATCH_SIZE = 500
 
 
 class FileManager:
@@ -9,6 +15,25 @@ class FileManager:
             db_connection: An instance of DBConnection.
         """
         self.db_connection = db_connection
+        self._listeners: List[Callable[[Optional[str], int], None]] = []
+
+    def add_listener(self, callback: Callable[[Optional[str], int], None]) -> None:
+        """
+        Registers callback(root, generation), called after every committed change to the files table.
+        root is the directory holding every changed path (None if unknown), generation the new index generation.
+        """
+        self._listeners.append(callback)
+
+    def get_generation(self) -> int:
+        """Current index generation, bumped in the same transaction as every change to the files table."""
+        try:
+            with self.db_connection.cursor() as cursor:
+                cursor.execute("SELECT generation FROM index_state")
+                row = cursor.fetchone()
+                return row[0] if row else 0
+        except Exception as e:
+            print(f"Error retrieving index generation: {e}")
+            return 0
 
     def add_file(self, file_data: Dict[str, str]) -> bool:
         """Adds or updates a file in the database."""
@@ -31,11 +56,59 @@ class FileManager:
                     file_data['size'], file_data['modified'], file_data['created'],
                     file_data.get('preview'), file_data.get('content')
                 ))
+                generation = self._bump_generation(cursor)
+            self._notify(os.path.dirname(file_data['path']), generation)
             return True
         except Exception as e:
             print(f"Error adding file: {e}")
             return False
 
+    def add_files(self, files: Iterable[Dict[str, str]], batch_size: int = DEFAULT_BATCH_SIZE) -> bool:
+        """
+        Adds or updates many files in the database.
+        Rows are sent as one multi-row INSERT ... ON CONFLICT per batch, and each
+        batch is committed once, instead of a round-trip and commit per file.
+        Args:
+            files: An iterable of file_data dictionaries (same shape as add_file).
+            batch_size: Number of rows written per statement/commit.
+        """
+        query = """
+        INSERT INTO files (path, filename, extension, size, modified, created, preview, content)
+        VALUES %s
+        ON CONFLICT (path) DO UPDATE SET
+            filename = EXCLUDED.filename,
+            extension = EXCLUDED.extension,
+            size = EXCLUDED.size,
+            modified = EXCLUDED.modified,
+            created = EXCLUDED.created,
+            preview = EXCLUDED.preview,
+            content = EXCLUDED.content
+        """
+        # Keyed by path: ON CONFLICT can't touch the same row twice in one statement
+        batch = {}
+        try:
+            for file_data in files:
+                batch[file_data['path']] = (
+                    file_data['path'], file_data['filename'], file_data['extension'],
+                    file_data['size'], file_data['modified'], file_data['created'],
+                    file_data.get('preview'), file_data.get('content')
+                )
+                if len(batch) >= batch_size:
+                    self._write_batch(query, batch, batch_size)
+                    batch = {}
+            if batch:
+                self._write_batch(query, batch, batch_size)
+            return True
+        except Exception as e:
+            print(f"Error adding files: {e}")
+            return False
+
+    def _write_batch(self, query: str, batch: Dict[str, tuple], batch_size: int) -> None:
+        with self.db_connection.cursor() as cursor:
+            execute_values(cursor, query, list(batch.values()), page_size=batch_size)
+            generation = self._bump_generation(cursor)
+        self._notify(self._common_root(batch.keys()), generation)
+
     def get_all_files(self) -> List[Dict[str, str]]:
         """Retrieves all files from the database."""
         query = "SELECT id, path FROM files"
@@ -47,13 +120,118 @@ class FileManager:
             print(f"Error retrieving all files: {e}")
             return []
 
+    def get_file_snapshot(self, root: str) -> Dict[str, Tuple[int, datetime.datetime]]:
+        """
+        Retrieves (size, modified) for every file indexed under a root, keyed by path.
+        Used by the indexer to skip files that didn't change since the last run.
+        """
+        query = "SELECT path, size, modified FROM files WHERE path LIKE %s ESCAPE '\\'"
+        try:
+            with self.db_connection.cursor() as cursor:
+                cursor.execute(query, (self._root_pattern(root),))
+                return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+        except Exception as e:
+            print(f"Error retrieving file snapshot: {e}")
+            return {}
+
+    def remove_files_by_path(self, paths: Iterable[str], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+        """Removes files from the database by path. Returns how many rows were deleted."""
+        query = "DELETE FROM files WHERE path = ANY(%s)"
+        paths = list(paths)
+        removed = 0
+        try:
+            for i in range(0, len(paths), batch_size):
+                with self.db_connection.cursor() as cursor:
+                    cursor.execute(query, (paths[i:i + batch_size],))
+                    if cursor.rowcount <= 0:
+                        continue
+                    removed += cursor.rowcount
+                    generation = self._bump_generation(cursor)
+                self._notify(self._common_root(paths[i:i + batch_size]), generation)
+            return removed
+        except Exception as e:
+            print(f"Error removing files: {e}")
+            return removed
+
+    def purge_missing(self, root: str, live_paths: Iterable[str], keep_roots: Iterable[str] = ()) -> int:
+        """
+        Removes every file indexed under root that isn't in live_paths, in one statement.
+        The live set is COPY'd into a temp table and anti-joined against files.
+        Args:
+            root: The indexed root; rows outside it are never touched.
+            live_paths: Paths that were found on disk during the walk.
+            keep_roots: Subdirectories whose rows must be kept (e.g. they couldn't be read).
+        Returns:
+            Number of rows purged (0 on error).
+        """
+        query = """
+        DELETE FROM files f
+        WHERE f.path LIKE %s ESCAPE '\\'
+          AND NOT (f.path LIKE ANY(%s))
+          AND NOT EXISTS (SELECT 1 FROM live_paths l WHERE l.path = f.path)
+        """
+        data = io.StringIO(''.join(self._copy_escape(p) + '\n' for p in live_paths))
+        try:
+            with self.db_connection.cursor() as cursor:
+                cursor.execute("CREATE TEMP TABLE live_paths (path TEXT PRIMARY KEY) ON COMMIT DROP")
+                cursor.copy_from(data, 'live_paths', columns=('path',))
+                cursor.execute("ANALYZE live_paths")
+                cursor.execute(query, (self._root_pattern(root), [self._root_pattern(r) for r in keep_roots]))
+                purged = cursor.rowcount
+                generation = self._bump_generation(cursor) if purged > 0 else None
+            if generation is not None:
+                self._notify(os.path.abspath(root), generation)
+            return purged
+        except Exception as e:
+            print(f"Error purging missing files: {e}")
+            return 0
+
+    @staticmethod
+    def _copy_escape(value: str) -> str:
+        """Escapes a value for COPY's text format"""
+        return (value.replace('\\', '\\\\').replace('\t', '\\t')
+                .replace('\n', '\\n').replace('\r', '\\r'))
+
+    @staticmethod
+    def _root_pattern(root: str) -> str:
+        """LIKE pattern matching every path below root (wildcards in root are escaped)"""
+        prefix = os.path.join(os.path.abspath(root), '')
+        prefix = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return prefix + '%'
+
     def remove_file(self, file_id: int) -> bool:
         """Removes a file from the database by ID."""
-        query = "DELETE FROM files WHERE id = %s"
+        query = "DELETE FROM files WHERE id = %s RETURNING path"
         try:
             with self.db_connection.cursor() as cursor:
                 cursor.execute(query, (file_id,))
+                row = cursor.fetchone()
+                generation = self._bump_generation(cursor) if row else None
+            if generation is not None:
+                self._notify(os.path.dirname(row[0]), generation)
             return True
         except Exception as e:
             print(f"Error removing file: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    @staticmethod
+    def _bump_generation(cursor) -> int:
+        """Increments the index generation inside the caller's transaction and returns the new value."""
+        cursor.execute("UPDATE index_state SET generation = generation + 1 RETURNING generation")
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _common_root(paths: Iterable[str]) -> Optional[str]:
+        """Deepest directory containing all paths (None if they share none, e.g. different drives)."""
+        try:
+            return os.path.commonpath([os.path.dirname(p) for p in paths])
+        except ValueError:
+            return None
+
+    def _notify(self, root: Optional[str], generation: int) -> None:
+        for callback in self._listeners:
+            try:
+                callback(root, generation)
+            except Exception as e:
+                print(f"Error notifying index change listener: {e}")
@@ -56,8 +56,10 @@ class SchemaManager:
             CREATE INDEX idx_file_content_gin ON files USING GIN(search_vector);
             CREATE INDEX idx_file_filename_gin ON files USING GIN(filename gin_trgm_ops);
             CREATE INDEX idx_file_preview_gin ON files USING GIN(preview gin_trgm_ops);
+            CREATE INDEX idx_file_path_trgm ON files USING GIN(path gin_trgm_ops);
         """)
         self._create_trigger(cursor)
+        self._create_index_state(cursor)
 
     def _update_schema_if_needed(self, cursor):
         """Updates the schema if necessary (e.g., adds missing columns or indexes)."""
@@ -86,6 +88,20 @@ class SchemaManager:
                     setweight(to_tsvector('english', COALESCE(content, '')), 'C');
             """)
 
+        # Lets "path ILIKE '%x%'" use an index instead of scanning the whole table
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_file_path_trgm ON files USING GIN(path gin_trgm_ops);")
+        self._create_index_state(cursor)
+
+    def _create_index_state(self, cursor):
+        """Creates the single-row table holding the index generation (bumped on every change to files)."""
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS index_state (
+                generation BIGINT NOT NULL
+            );
+            INSERT INTO index_state (generation)
+            SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM index_state);
+        """)
+
     def _create_trigger(self, cursor):
         """Creates a trigger to update the search vector."""
         cursor.execute("""
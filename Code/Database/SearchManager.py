@@ -1,4 +1,6 @@
-from typing import List, Dict, Optional, Union, Callable
+from typing import List, Dict, Optional, Union, Callable, Tuple
+import base64
+import json
 import logging
 from abc import ABC, abstractmethod
 
@@ -8,103 +10,266 @@ logging.basicConfig(level=logging.DEBUG,
 logger = logging.getLogger(__name__)
 
 
+def encode_cursor(key: list) -> str:
+    """Turns a keyset position into an opaque, URL-safe token"""
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_cursor(token: Optional[str]) -> Optional[list]:
+    """Inverse of encode_cursor. None means 'start from the first result'."""
+    if not token:
+        return None
+    return json.loads(base64.urlsafe_b64decode(token.encode()))
+
+
+def page_by_path(inner: str, params: list, limit: Optional[int], key: Optional[list]) -> Tuple[str, list]:
+    """
+    Orders a query selecting (id, filename, path) by path and resumes after key[-1].
+    LIMIT NULL means no limit, so limit=None returns everything after the cursor.
+    """
+    query = f"SELECT r.id, r.filename, r.path FROM ({inner}) r"
+    params = list(params)
+    if key:
+        query += " WHERE r.path > %s"
+        params.append(key[-1])
+    query += " ORDER BY r.path LIMIT %s"
+    params.append(limit)
+    return query, params
+
+
+def page_by_rank(inner: str, params: list, limit: Optional[int], key: Optional[list]) -> Tuple[str, list]:
+    """
+    Orders a query selecting (id, filename, path, rank) by (rank DESC, id) and resumes after (key[-2], key[-1]).
+    The rank is compared as real, the type ts_rank returns, so it round-trips exactly.
+    """
+    query = f"SELECT r.id, r.filename, r.path, r.rank FROM ({inner}) r"
+    params = list(params)
+    if key:
+        query += " WHERE (r.rank < %s::real OR (r.rank = %s::real AND r.id > %s))"
+        params.extend([key[-2], key[-2], key[-1]])
+    query += " ORDER BY r.rank DESC, r.id LIMIT %s"
+    params.append(limit)
+    return query, params
+
+
 class SearchStrategy(ABC):
-    """Abstract base class for different search strategies."""
+    """
+    Abstract base class for different search strategies.
+    Results come in a stable order (by path, or by rank then id) so they can be paged:
+    every result carries the cursor that resumes right after it.
+    """
     
     @abstractmethod
-    def execute(self, db_connection, *args, **kwargs) -> List[Dict[str, str]]:
+    def execute(self, db_connection, *args, limit: Optional[int] = None, cursor: Optional[str] = None,
+                **kwargs) -> List[Dict[str, str]]:
         """Execute the search strategy."""
         pass
 
+    @abstractmethod
+    def build_query(self, *args, limit: Optional[int] = None, cursor: Optional[str] = None) -> Tuple[Optional[str], list]:
+        """Builds the (query, params) the strategy runs, or (None, []) if there's nothing to run."""
+        pass
+
+    def estimate_count(self, db_connection, *args) -> Optional[int]:
+        """Cheap total-count estimate taken from the planner's row estimate, without running the query."""
+        try:
+            query, params = self.build_query(*args)
+            if query is None:
+                return 0
+            return self._planned_rows(db_connection, query, params)
+        except Exception as e:
+            logger.error(f"Error estimating result count: {e}")
+            return None
+
+    @staticmethod
+    def _planned_rows(db_connection, query: str, params: list) -> int:
+        with db_connection.cursor() as cursor:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def find_seq_scans(self, db_connection, *args) -> List[str]:
+        """
+        EXPLAINs the strategy's query and lists the relations the plan reads with a sequential scan.
+        An empty list means every branch is driven by an index.
+        """
+        query, params = self.build_query(*args)
+        if query is None:
+            return []
+        with db_connection.cursor() as cursor:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        seq_scans = []
+        nodes = [plan[0]["Plan"]]
+        while nodes:
+            node = nodes.pop()
+            if node.get("Node Type") == "Seq Scan":
+                seq_scans.append(node.get("Relation Name"))
+            nodes.extend(node.get("Plans", []))
+        return seq_scans
+
+    @staticmethod
+    def _fetch(db_connection, query: str, params: list, ranked: bool, prefix: list = None) -> List[Dict[str, str]]:
+        """Runs a paged query and attaches each row's resume cursor (prefixed with prefix, if any)."""
+        prefix = prefix or []
+        with db_connection.cursor() as cursor:
+            db_connection.execute_prepared(cursor, query, params)
+            rows = cursor.fetchall()
+        results = []
+        for row in rows:
+            key = prefix + ([row[3], row[0]] if ranked else [row[2]])
+            results.append({"id": row[0], "filename": row[1], "path": row[2], "cursor": encode_cursor(key)})
+        return results
+
 
 class ExtensionSearchStrategy(SearchStrategy):
-    def execute(self, db_connection, extension: str) -> List[Dict[str, str]]:
+    def execute(self, db_connection, extension: str, limit: Optional[int] = None,
+                cursor: Optional[str] = None) -> List[Dict[str, str]]:
         logger.debug(f"Searching by extension: '{extension}'")
-        query = "SELECT filename, path FROM files WHERE extension = %s"
         try:
-            with db_connection.cursor() as cursor:
-                cursor.execute(query, (extension,))
-                results = cursor.fetchall()
-                logger.debug(f"Extension search found {len(results)} results")
-                return [{"filename": row[0], "path": row[1]} for row in results]
+            query, params = self.build_query(extension, limit=limit, cursor=cursor)
+            results = self._fetch(db_connection, query, params, ranked=False)
+            logger.debug(f"Extension search found {len(results)} results")
+            return results
         except Exception as e:
             logger.error(f"Error searching by extension: {e}")
-            return []
+            raise
+
+    def build_query(self, extension: str, limit: Optional[int] = None,
+                    cursor: Optional[str] = None) -> Tuple[Optional[str], list]:
+        inner = "SELECT id, filename, path FROM files WHERE extension = %s"
+        return page_by_path(inner, [extension], limit, decode_cursor(cursor))
 
 
 class ContentSearchStrategy(SearchStrategy):
-    def execute(self, db_connection, search_term: str) -> List[Dict[str, str]]:
+    def execute(self, db_connection, search_term: str, limit: Optional[int] = None,
+                cursor: Optional[str] = None) -> List[Dict[str, str]]:
         logger.debug(f"Searching by content: '{search_term}'")
         try:
-            search_query = ' & '.join(search_term.split())
-            tsquery = f"to_tsquery('english', '{search_query}')"
-            like_term = f'%{search_term}%'
-            
-            logger.debug(f"tsquery: {tsquery}")
-            logger.debug(f"like_term: {like_term}")
-            
-            query = f"""
-            SELECT DISTINCT f.filename, f.path, ts_rank(f.search_vector, {tsquery}) as rank
-            FROM files f
-            WHERE 
-                f.search_vector @@ {tsquery} OR
-                f.filename ILIKE %s OR
-                f.path ILIKE %s
-            ORDER BY rank DESC
-            """
-            
-            with db_connection.cursor() as cursor:
-                cursor.execute(query, (like_term, like_term))
-                results = cursor.fetchall()
-                logger.debug(f"Content search found {len(results)} results")
-                return [{"filename": row[0], "path": row[1]} for row in results]
+            query, params = self.build_query(search_term, limit=limit, cursor=cursor)
+            results = self._fetch(db_connection, query, params, ranked=True)
+            logger.debug(f"Content search found {len(results)} results")
+            return results
         except Exception as e:
             logger.error(f"Error searching by content: {e}")
-            return []
+            raise
+
+    def build_query(self, search_term: str, limit: Optional[int] = None,
+                    cursor: Optional[str] = None) -> Tuple[Optional[str], list]:
+        """
+        One branch per index (GIN tsvector, trigram on filename, trigram on path), UNIONed.
+        An OR across the three predicates can't be answered from any single index and ends
+        up as a sequential scan; separate branches can each use a bitmap index scan.
+        Trigram indexes only help for terms of 3+ characters.
+        """
+        tsquery = "websearch_to_tsquery('english', %s)"
+        like_term = f'%{search_term}%'
+
+        logger.debug(f"like_term: {like_term}")
+
+        # UNION also removes the duplicates (a file matching more than one branch)
+        inner = f"""
+        SELECT f.id, f.filename, f.path, ts_rank(f.search_vector, {tsquery}) as rank
+        FROM files f WHERE f.search_vector @@ {tsquery}
+        UNION
+        SELECT f.id, f.filename, f.path, ts_rank(f.search_vector, {tsquery}) as rank
+        FROM files f WHERE f.filename ILIKE %s
+        UNION
+        SELECT f.id, f.filename, f.path, ts_rank(f.search_vector, {tsquery}) as rank
+        FROM files f WHERE f.path ILIKE %s
+        """
+        # The search term is always bound, never pasted into the SQL
+        params = [search_term, search_term, search_term, like_term, search_term, like_term]
+        return page_by_rank(inner, params, limit, decode_cursor(cursor))
 
 
 class MultiWordSearchStrategy(SearchStrategy):
-    def execute(self, db_connection, search_words: List[str]) -> List[Dict[str, str]]:
+    # Cursor prefixes telling which of the two searches a page belongs to
+    FULL_TEXT = 'fts'
+    PATTERN = 'like'
+
+    def execute(self, db_connection, search_words: List[str], limit: Optional[int] = None,
+                cursor: Optional[str] = None) -> List[Dict[str, str]]:
         logger.debug(f"Searching for multiple words: {search_words}")
         try:
             if not search_words:
                 logger.debug("No search words provided, returning empty results")
                 return []
 
-            search_query = ' & '.join(search_words)
-            tsquery = f"to_tsquery('english', '{search_query}')"
-            logger.debug(f"Full-text search query: {tsquery}")
-            
+            key = decode_cursor(cursor)
+            # Later pages of the fallback stay on the fallback
+            if key and key[0] == self.PATTERN:
+                return self._pattern_matching_search(db_connection, search_words, limit, key)
+
             # First try full-text search
-            results = self._full_text_search(db_connection, tsquery)
+            results = self._full_text_search(db_connection, search_words, limit, key)
             
-            # Fallback to pattern matching if no results
-            if not results:
-                results = self._pattern_matching_search(db_connection, search_words)
+            # Fallback to pattern matching if no results (only decided on the first page)
+            if not results and not key:
+                results = self._pattern_matching_search(db_connection, search_words, limit, None)
                 
             return results
         except Exception as e:
             logger.error(f"Error searching multiple words: {e}", exc_info=True)
-            return []
-    
-    def _full_text_search(self, db_connection, tsquery: str) -> List[Dict[str, str]]:
-        logger.debug("Performing full-text search")
-        query = f"""
-        SELECT f.filename, f.path, ts_rank(f.search_vector, {tsquery}) as rank
+            raise
+
+    def build_query(self, search_words: List[str], limit: Optional[int] = None,
+                    cursor: Optional[str] = None) -> Tuple[Optional[str], list]:
+        if not search_words:
+            return None, []
+        return self._full_text_query(search_words, limit, decode_cursor(cursor))
+
+    def estimate_count(self, db_connection, search_words: List[str]) -> Optional[int]:
+        """Estimates whichever query will answer: the pattern fallback runs when full-text search finds nothing."""
+        if not search_words:
+            return 0
+        try:
+            query, params = self._full_text_query(search_words, 1, None)
+            with db_connection.cursor() as cursor:
+                cursor.execute(query, params)
+                full_text_matches = cursor.fetchone() is not None
+            if full_text_matches:
+                return super().estimate_count(db_connection, search_words)
+            return self._planned_rows(db_connection, *self._pattern_query(search_words, None, None))
+        except Exception as e:
+            logger.error(f"Error estimating result count: {e}")
+            return None
+
+    def _full_text_query(self, search_words: List[str], limit: Optional[int], key: Optional[list]) -> Tuple[str, list]:
+        # plainto_tsquery ANDs the words and ignores any tsquery syntax in them
+        search_query = ' '.join(search_words)
+        logger.debug(f"Full-text search query: '{search_query}'")
+        inner = """
+        SELECT f.id, f.filename, f.path, ts_rank(f.search_vector, plainto_tsquery('english', %s)) as rank
         FROM files f
-        WHERE f.search_vector @@ {tsquery}
-        ORDER BY rank DESC
+        WHERE f.search_vector @@ plainto_tsquery('english', %s)
         """
-        with db_connection.cursor() as cursor:
-            cursor.execute(query)
-            results = cursor.fetchall()
-            logger.debug(f"Full-text search found {len(results)} results")
-            return [{"filename": row[0], "path": row[1]} for row in results]
+        return page_by_rank(inner, [search_query, search_query], limit, key)
+    
+    def _full_text_search(self, db_connection, search_words: List[str], limit: Optional[int],
+                          key: Optional[list]) -> List[Dict[str, str]]:
+        logger.debug("Performing full-text search")
+        query, params = self._full_text_query(search_words, limit, key)
+        results = self._fetch(db_connection, query, params, ranked=True, prefix=[self.FULL_TEXT])
+        logger.debug(f"Full-text search found {len(results)} results")
+        return results
     
-    def _pattern_matching_search(self, db_connection, search_words: List[str]) -> List[Dict[str, str]]:
+    def _pattern_matching_search(self, db_connection, search_words: List[str], limit: Optional[int],
+                                 key: Optional[list]) -> List[Dict[str, str]]:
         logger.debug("Falling back to pattern matching")
+        query, params = self._pattern_query(search_words, limit, key)
+        results = self._fetch(db_connection, query, params, ranked=False, prefix=[self.PATTERN])
+        logger.debug(f"Fallback search found {len(results)} results")
+        return results
+
+    def _pattern_query(self, search_words: List[str], limit: Optional[int], key: Optional[list]) -> Tuple[str, list]:
         fallback_query = """
-        SELECT f.filename, f.path
+        SELECT f.id, f.filename, f.path
         FROM files f
         WHERE 
         """
@@ -119,44 +284,117 @@ class MultiWordSearchStrategy(SearchStrategy):
             """)
             params.extend([word_param, word_param, word_param])
         fallback_query += " AND ".join(conditions)
-        
-        with db_connection.cursor() as cursor:
-            cursor.execute(fallback_query, params)
-            results = cursor.fetchall()
-            logger.debug(f"Fallback search found {len(results)} results")
-            return [{"filename": row[0], "path": row[1]} for row in results]
+        return page_by_path(fallback_query, params, limit, key)
 
 
 class PathSearchStrategy(SearchStrategy):
-    def execute(self, db_connection, path: str) -> List[Dict[str, str]]:
+    def execute(self, db_connection, path: str, limit: Optional[int] = None,
+                cursor: Optional[str] = None) -> List[Dict[str, str]]:
         logger.debug(f"Searching by path: '{path}'")
         try:
-            # Normalize the search path
-            search_path = path.replace('\\', '/').lower()
-            
-            # Different search strategies
-            if search_path.startswith('/') or search_path.startswith('\\'):
-                like_path = f"{search_path}%"  # Absolute path prefix search
-            elif '/' in search_path or '\\' in search_path:
-                like_path = f"%{search_path}%"  # Path component search
-            else:
-                like_path = f"%/{search_path}%"  # Directory or file name search
-                
-            query = """
-            SELECT filename, path
-            FROM files
-            WHERE LOWER(REPLACE(path, '\\', '/')) LIKE %s
-            ORDER BY path, filename
-            """
-            
-            with db_connection.cursor() as cursor:
-                cursor.execute(query, (like_path,))
-                results = cursor.fetchall()
-                logger.debug(f"Path search found {len(results)} results")
-                return [{"filename": row[0], "path": row[1]} for row in results]
+            query, params = self.build_query(path, limit=limit, cursor=cursor)
+            results = self._fetch(db_connection, query, params, ranked=False)
+            logger.debug(f"Path search found {len(results)} results")
+            return results
         except Exception as e:
             logger.error(f"Error searching by path: {e}")
-            return []
+            raise
+
+    def build_query(self, path: str, limit: Optional[int] = None,
+                    cursor: Optional[str] = None) -> Tuple[Optional[str], list]:
+        inner = """
+        SELECT id, filename, path
+        FROM files
+        WHERE LOWER(REPLACE(path, '\\', '/')) LIKE %s
+        """
+        return page_by_path(inner, [self.like_pattern(path)], limit, decode_cursor(cursor))
+
+    @staticmethod
+    def like_pattern(path: str) -> str:
+        """Builds the LIKE pattern matched against the normalized (lowercase, '/') path"""
+        # Normalize the search path
+        search_path = path.replace('\\', '/').lower()
+
+        # Different search strategies
+        if search_path.startswith('/') or search_path.startswith('\\'):
+            return f"{search_path}%"  # Absolute path prefix search
+        elif '/' in search_path or '\\' in search_path:
+            return f"%{search_path}%"  # Path component search
+        else:
+            return f"%/{search_path}%"  # Directory or file name search
+
+
+class QualifiedSearchStrategy(SearchStrategy):
+    """
+    Compiles a parsed qualifier query (path:, content:, extension:) into one SQL statement.
+    Every value becomes a predicate and all of them are ANDed in the database instead of us
+    intersecting whole result sets in Python.
+    """
+
+    def execute(self, db_connection, parsed_query: Dict[str, List[str]], limit: Optional[int] = None,
+                cursor: Optional[str] = None) -> List[Dict[str, str]]:
+        logger.debug(f"Searching by qualifiers: {parsed_query}")
+        try:
+            query, params = self.build_query(parsed_query, limit=limit, cursor=cursor)
+            if query is None:
+                return []
+
+            results = self._fetch(db_connection, query, params, ranked='content' in parsed_query)
+            logger.debug(f"Qualified search found {len(results)} results")
+            return results
+        except Exception as e:
+            logger.error(f"Error searching by qualifiers: {e}")
+            raise
+
+    def build_query(self, parsed_query: Dict[str, List[str]], limit: Optional[int] = None,
+                    cursor: Optional[str] = None) -> Tuple[Optional[str], list]:
+        """
+        Builds the parameterized statement for a parsed query.
+
+        Returns:
+            (query, params), or (None, []) if there is nothing to search for
+        """
+        conditions = []
+        params = []
+        rank_terms = []
+        rank_params = []
+
+        for path in parsed_query.get('path', []):
+            conditions.append("LOWER(REPLACE(f.path, '\\', '/')) LIKE %s")
+            params.append(PathSearchStrategy.like_pattern(path))
+
+        for content in parsed_query.get('content', []):
+            like_term = f'%{content}%'
+            # The same three branches ContentSearchStrategy UNIONs: an OR of them can't use any index
+            conditions.append("""f.id IN (
+                SELECT id FROM files WHERE search_vector @@ websearch_to_tsquery('english', %s)
+                UNION SELECT id FROM files WHERE filename ILIKE %s
+                UNION SELECT id FROM files WHERE path ILIKE %s)""")
+            params.extend([content, like_term, like_term])
+            rank_terms.append("ts_rank(f.search_vector, websearch_to_tsquery('english', %s))")
+            rank_params.append(content)
+
+        for extension in parsed_query.get('extension', []):
+            conditions.append("f.extension = %s")
+            params.append(extension)
+
+        if not conditions:
+            return None, []
+
+        key = decode_cursor(cursor)
+        where = ' AND '.join(conditions)
+        # Content matches are ranked like ContentSearchStrategy, anything else is listed by path
+        if rank_terms:
+            inner = f"""
+            SELECT f.id, f.filename, f.path, {' + '.join(rank_terms)} AS rank
+            FROM files f
+            WHERE {where}
+            """
+            # The rank expressions come first in the SELECT list
+            return page_by_rank(inner, rank_params + params, limit, key)
+
+        inner = f"SELECT f.id, f.filename, f.path FROM files f WHERE {where}"
+        return page_by_path(inner, params, limit, key)
 
 class SearchManager:
     def __init__(self, db_connection):
@@ -171,6 +409,7 @@ class SearchManager:
             'content': ContentSearchStrategy(),
             'multi_word': MultiWordSearchStrategy(),
             'path': PathSearchStrategy(),
+            'qualified': QualifiedSearchStrategy(),
         }
     
     def search(self, strategy_name: str, *args, **kwargs) -> List[Dict[str, str]]:
@@ -183,6 +422,9 @@ class SearchManager:
             
         Returns:
             List of dictionaries with search results
+
+        Raises:
+            Database errors, so a failed search is never mistaken for (and cached as) no results
         """
         if strategy_name not in self.strategies:
             logger.error(f"Unknown search strategy: {strategy_name}")
@@ -191,18 +433,56 @@ class SearchManager:
         strategy = self.strategies[strategy_name]
         return strategy.execute(self.db_connection, *args, **kwargs)
     
+    def estimate_count(self, strategy_name: str, *args) -> Optional[int]:
+        """
+        Cheap estimate of how many results a search would return (None if unknown).
+
+        Args:
+            strategy_name: Name of the search strategy to use
+            *args: Parameters to pass to the strategy
+        """
+        if strategy_name not in self.strategies:
+            logger.error(f"Unknown search strategy: {strategy_name}")
+            return None
+        return self.strategies[strategy_name].estimate_count(self.db_connection, *args)
+
+    def find_seq_scans(self, strategy_name: str, *args) -> List[str]:
+        """
+        Relations the strategy's plan reads with a sequential scan (empty if all branches use indexes).
+
+        Args:
+            strategy_name: Name of the search strategy to check
+            *args: Parameters to pass to the strategy
+        """
+        if strategy_name not in self.strategies:
+            logger.error(f"Unknown search strategy: {strategy_name}")
+            return []
+        seq_scans = self.strategies[strategy_name].find_seq_scans(self.db_connection, *args)
+        if seq_scans:
+            logger.warning(f"Search strategy '{strategy_name}' sequentially scans: {seq_scans}")
+        return seq_scans
+
     # Convenience methods to maintain backward compatibility
-    def search_by_extension(self, extension: str) -> List[Dict[str, str]]:
-        return self.search('extension', extension)
+    # limit/cursor page through results; leaving them out returns everything
+    def search_by_extension(self, extension: str, limit: Optional[int] = None,
+                            cursor: Optional[str] = None) -> List[Dict[str, str]]:
+        return self.search('extension', extension, limit=limit, cursor=cursor)
         
-    def search_by_content(self, search_term: str) -> List[Dict[str, str]]:
-        return self.search('content', search_term)
+    def search_by_content(self, search_term: str, limit: Optional[int] = None,
+                          cursor: Optional[str] = None) -> List[Dict[str, str]]:
+        return self.search('content', search_term, limit=limit, cursor=cursor)
     
-    def search_multi_words(self, search_words: List[str]) -> List[Dict[str, str]]:
-        return self.search('multi_word', search_words)
+    def search_multi_words(self, search_words: List[str], limit: Optional[int] = None,
+                           cursor: Optional[str] = None) -> List[Dict[str, str]]:
+        return self.search('multi_word', search_words, limit=limit, cursor=cursor)
     
-    def search_by_path(self, path: str) -> List[Dict[str, str]]:
-        return self.search('path', path)
+    def search_by_path(self, path: str, limit: Optional[int] = None,
+                       cursor: Optional[str] = None) -> List[Dict[str, str]]:
+        return self.search('path', path, limit=limit, cursor=cursor)
+
+    def search_by_qualifiers(self, parsed_query: Dict[str, List[str]], limit: Optional[int] = None,
+                             cursor: Optional[str] = None) -> List[Dict[str, str]]:
+        return self.search('qualified', parsed_query, limit=limit, cursor=cursor)
     
     def register_strategy(self, name: str, strategy: SearchStrategy) -> None:
         """
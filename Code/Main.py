@@ -1,6 +1,8 @@
-from flask import Flask, flash, jsonify, request, render_template, redirect, url_for
+from flask import Flask, Response, flash, jsonify, request, render_template, redirect, url_for
 from dotenv import load_dotenv
 import os
+import atexit
+import threading
 import psycopg2
 import requests
 
@@ -10,9 +12,17 @@ from .Database.SearchManager import SearchManager
 from .Database.SchemaManager import SchemaManager
 
 from .MiddleManagement.FileIndexer import FileIndexer
+from .MiddleManagement.FileWatcher import FileWatcher
+from .MiddleManagement.HybridSearch import HybridSearch
+from .MiddleManagement.IndexJobs import IndexJobScheduler
 from .MiddleManagement.SearchSelector import SearchSelector
 from .MiddleManagement.WidgetManager import WidgetManager
 from .MiddleManagement.SearchSelectorProxy import SearchSelectorProxy
+from .MiddleManagement.SearchCache import SearchCache
+from .MiddleManagement.SharedSearchCache import SharedSearchCache, DEFAULT_PATH as SHARED_CACHE_DEFAULT_PATH
+from .MiddleManagement.QueryLog import QueryLog
+from .MiddleManagement.IndexlessQuery.Dispatcher import IndexlessSearch, LocalTransport
+from .MiddleManagement.IndexlessQuery.ResultCache import ResultCache
 
 # Initialize Flask app
 app = Flask(__name__, template_folder='../Templates')
@@ -34,15 +44,52 @@ db_config = {
 
 
 # Initialize database connection and managers
-db_connection = DBConnection(db_config)
+db_connection = DBConnection(db_config,
+                             min_size=int(os.getenv("DB_POOL_MIN", 1)),
+                             max_size=int(os.getenv("DB_POOL_MAX", 10)))
 schema_manager = SchemaManager(db_connection)
 file_manager = FileManager(db_connection)
 search_manager = SearchManager(db_connection)
-file_indexer = FileIndexer(file_manager)
+file_indexer = FileIndexer(file_manager,
+                           batch_size=int(os.getenv("INDEX_BATCH_SIZE", 500)),
+                           incremental=os.getenv("INDEX_INCREMENTAL", "true").lower() == "true",
+                           cleanup=os.getenv("INDEX_CLEANUP", "true").lower() == "true",
+                           reader_workers=int(os.getenv("INDEX_READER_WORKERS", 4)),
+                           queue_size=int(os.getenv("INDEX_QUEUE_SIZE", 1000)))
+# Indexing runs in the background; this many roots are indexed at the same time
+index_jobs = IndexJobScheduler(file_indexer, max_workers=int(os.getenv("INDEX_JOB_WORKERS", 2)))
+# Keeps indexed roots fresh between full runs; "auto" uses inotify on Linux and polling elsewhere
+file_watcher = FileWatcher(file_indexer,
+                           backend=os.getenv("WATCH_BACKEND", "auto").lower(),
+                           debounce=float(os.getenv("WATCH_DEBOUNCE", 1.0)),
+                           max_delay=float(os.getenv("WATCH_MAX_DELAY", 10.0)),
+                           poll_interval=float(os.getenv("WATCH_POLL_INTERVAL", 5.0)),
+                           jobs=index_jobs)
+WATCH_ENABLED = os.getenv("WATCH_ENABLED", "true").lower() == "true"
+# Watched from startup, and expected to have been indexed by an earlier run
+WATCH_PATHS = [os.path.abspath(p) for p in filter(None, os.getenv("WATCH_PATHS", "").split(os.pathsep))]
 real_search_selector = SearchSelector(search_manager)
-search_selector = SearchSelectorProxy(real_search_selector)
+cache_config = {
+    "expiry_time": int(os.getenv("CACHE_EXPIRY", 600)),
+    "max_entries": int(os.getenv("CACHE_MAX_ENTRIES", 1000)),
+    "max_bytes": int(os.getenv("CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+}
+# "sqlite" shares one cache file between all worker processes on this machine
+if os.getenv("CACHE_BACKEND", "memory").lower() == "sqlite":
+    search_cache = SharedSearchCache(path=os.getenv("CACHE_SQLITE_PATH", SHARED_CACHE_DEFAULT_PATH), **cache_config)
+else:
+    search_cache = SearchCache(**cache_config)
+# Opt-in: the log holds raw user queries (and is what cache warm-up replays)
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH")
+search_selector = SearchSelectorProxy(real_search_selector,
+                                      negative_cache_expiry=int(os.getenv("CACHE_NEGATIVE_EXPIRY", 30)),
+                                      cache=search_cache,
+                                      query_log=QueryLog(QUERY_LOG_PATH) if QUERY_LOG_PATH else None)
 widget_manager = WidgetManager()
 
+# Every committed change to the index drops the cached results it can affect
+file_manager.add_listener(search_selector.on_index_changed)
+
 
 # Default path for indexing
 current_file = os.path.abspath(__file__)
@@ -51,6 +98,57 @@ DEFAULT_PATH = project_dir
 
 MANAGER_ADDRESS = "http://localhost:5001/api/search"
 
+# Indexless search transport: "http" goes through the SearchManager and its HTTP workers (multi-node),
+# "local" runs the same scans in a process pool of this app (single box, no HTTP hops)
+INDEXLESS_TRANSPORT = os.getenv("INDEXLESS_TRANSPORT", "http").lower()
+local_indexless_search = None
+if INDEXLESS_TRANSPORT == "local":
+    local_indexless_search = IndexlessSearch(
+        LocalTransport(int(os.getenv("INDEXLESS_LOCAL_PROCESSES", os.cpu_count() or 2))),
+        deadline=float(os.getenv("INDEXLESS_SEARCH_DEADLINE", 15)),
+        cache=ResultCache(max_entries=int(os.getenv("INDEXLESS_CACHE_MAX_ENTRIES", 256)),
+                          max_results=int(os.getenv("INDEXLESS_CACHE_MAX_RESULTS", 200000))))
+
+
+def stream_indexless(query, path, limit=None, mode="filename"):
+    """
+    NDJSON lines of an indexless search, from the local process pool or the search manager.
+    """
+    if local_indexless_search is not None:
+        return local_indexless_search.stream(query, path, limit, mode)
+    return _manager_lines(query, path, limit, mode)
+
+
+def _manager_lines(query, path, limit, mode):
+    with requests.get(MANAGER_ADDRESS, params={"q": query, "path": path, "limit": limit, "mode": mode},
+                      stream=True, timeout=(2, 30)) as response:
+        response.raise_for_status()
+        yield from response.iter_lines()
+
+
+def hybrid_indexed_roots():
+    """
+    Roots the index covers: those a job indexed completely since startup, plus WATCH_PATHS unless
+    a job is indexing them right now. Roots watched because a job was submitted for them only count
+    once that job is done (a failed or cancelled job leaves them unindexed).
+    """
+    indexing = [os.path.abspath(job.root) for job in index_jobs.list_jobs() if job.active]
+    return index_jobs.indexed_roots() + [
+        root for root in WATCH_PATHS
+        if not any(root == r or root.startswith(os.path.join(r, '')) for r in indexing)]
+
+
+# Database index for indexed roots, live scans for unindexed roots and changes not indexed yet
+hybrid_search = HybridSearch(search_selector, stream_indexless,
+                             indexed_roots=hybrid_indexed_roots,
+                             pending_changes=file_watcher.pending_changes,
+                             deadline=float(os.getenv("HYBRID_SEARCH_DEADLINE", 10)))
+
+# Results per /search page, and whether the first page shows an estimated total
+# (opt-in: it costs an extra database round trip, even when the page itself is cached)
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", 50))
+SEARCH_ESTIMATE_COUNT = os.getenv("SEARCH_ESTIMATE_COUNT", "false").lower() == "true"
+
 @app.route('/')
 def home():
     """
@@ -66,13 +164,21 @@ def search():
     """
     try:
         query = request.args.get('q', '')
-        results = search_selector.search_prompt(query)
+        cursor = request.args.get('cursor')
+
+        # One extra row tells whether there is a next page
+        results = search_selector.search_prompt(query, limit=SEARCH_PAGE_SIZE + 1, cursor=cursor)
+        next_cursor = results[SEARCH_PAGE_SIZE - 1]['cursor'] if len(results) > SEARCH_PAGE_SIZE else None
+        results = results[:SEARCH_PAGE_SIZE]
+        estimated_total = search_selector.estimate_count(query) if SEARCH_ESTIMATE_COUNT and not cursor else None
         
         widgets = widget_manager.get_widgets_for_query(query)
         
         return render_template('search-result.html', 
                             results=results, 
                             query=query,
+                            next_cursor=next_cursor,
+                            estimated_total=estimated_total,
                             widgets=widgets)  
     except Exception as e:
         app.logger.error(f"Search error: {e}")
@@ -82,24 +188,90 @@ def search():
                               results=[], # I think we will most of the time...
                               system_error=f"Error performing search: {str(e)}")
 
+@app.route('/search/hybrid', methods=['GET'])
+def search_hybrid():
+    """
+    Search the index and live-scan what it doesn't cover yet, as one ranked result page.
+    """
+    query = request.args.get('q', '')
+    path = request.args.get('path') or None
+    try:
+        found = hybrid_search.search(query, path=path, limit=SEARCH_PAGE_SIZE)
+        return render_template('search-result.html',
+                               results=found["results"],
+                               query=query,
+                               widgets=widget_manager.get_widgets_for_query(query))
+    except Exception as e:
+        app.logger.error(f"Hybrid search error: {e}")
+        return render_template('search-result.html',
+                               query=query,
+                               results=[],
+                               system_error=f"Error performing search: {str(e)}")
+
+
+@app.route("/api/search/hybrid", methods=["GET"])
+def api_search_hybrid():
+    """
+    JSON hybrid search: {"results", "count", "partial", "errors", "sources", "scanned", "pending_changes"}.
+    """
+    query = request.args.get('q', '')
+    path = request.args.get('path') or None
+    limit = request.args.get('limit', SEARCH_PAGE_SIZE, type=int)
+    if path and not os.path.isdir(path):
+        return jsonify({"error": f"Error reading directory: {path} is not a directory"}), 400
+    return jsonify(hybrid_search.search(query, path=path, limit=limit))
+
+
 @app.route("/api/search", methods=["GET"])
 def api_search():
     """
     Route for IndexlessQueries. Assignment 2
+    Streams the manager's NDJSON through as it arrives: one match per line, then a summary line.
     """
     query = request.args.get('q', '')
     path = request.args.get('path')
+    limit = request.args.get('limit', type=int)
+    mode = request.args.get('mode', 'filename')  # "content" searches inside the files
+
+    if local_indexless_search is not None:
+        if mode not in ("filename", "content"):
+            return jsonify({"error": f"Unknown mode: {mode}"}), 400
+        if not path or not os.path.isdir(path):
+            return jsonify({"error": f"Error reading directory: {path} is not a directory"}), 400
+        return Response(local_indexless_search.stream(query, path, limit, mode), mimetype="application/x-ndjson")
 
     try:
-        response = requests.get(MANAGER_ADDRESS, params={"q": query, "path": path})
+        response = requests.get(MANAGER_ADDRESS, params={"q": query, "path": path, "limit": limit, "mode": mode},
+                                stream=True)
         if response.status_code == 200:
-            return jsonify({"results": response.json().get("results", [])})
+            def relay():
+                try:
+                    for chunk in response.iter_content(chunk_size=None):
+                        yield chunk
+                finally:
+                    response.close()  # Also tells the manager to stop if our client went away
+            return Response(relay(), mimetype="application/x-ndjson")
         else:
+            response.close()
             return jsonify({"error": f"Manager returned status {response.status_code}"}), response.status_code
     except Exception as e:
         return jsonify({"error": f"Error connecting to search manager: {str(e)}"}), 500
 
 
+@app.route("/api/search/cache/stats", methods=["GET"])
+def api_search_cache_stats():
+    """
+    Statistics of the indexless result cache (kept by the manager, or by this app in local mode).
+    """
+    if local_indexless_search is not None:
+        return jsonify(local_indexless_search.cache.stats())
+    try:
+        response = requests.get(MANAGER_ADDRESS.replace("/api/search", "/api/cache/stats"), timeout=5)
+        return jsonify(response.json()), response.status_code
+    except Exception as e:
+        return jsonify({"error": f"Error connecting to search manager: {str(e)}"}), 500
+
+
 @app.route('/open_file')
 def open_file():
     """
@@ -113,19 +285,12 @@ def open_file():
 @app.route('/set_index_path', methods=['POST'])
 def set_index_path():
     """
-    Set a new index path and re-index the files in the database.
+    Set a new index path and re-index the files in the database (as a background job).
     """
     try:
         new_path = request.form.get('path', '')
-
-        # Cleanup: Remove files from the database that no longer exist
-        existing_files = file_manager.get_all_files()
-        for f in existing_files:
-            if not os.path.exists(f['path']):
-                file_manager.remove_file(f['id'])
-
-        file_indexer.index_path(new_path)
-        flash(f"Successfully indexed path: {new_path}")
+        job = submit_index_job(new_path)
+        flash(f"Indexing of {job.root} started in the background (job {job.id})")
         return redirect(url_for('home'))
     except Exception as e:
         app.logger.error(f"Search error: {e}")
@@ -134,6 +299,59 @@ def set_index_path():
         return redirect(url_for('home'))
 
 
+def submit_index_job(path):
+    if not os.path.isdir(path):
+        raise ValueError(f"Not a directory: {path}")
+    # Watch first, so changes made while the walk runs aren't missed
+    if WATCH_ENABLED:
+        file_watcher.watch(path)
+    # Files under the path that no longer exist are purged by the indexer itself
+    return index_jobs.submit(path)
+
+
+@app.route('/index/jobs', methods=['GET'])
+def list_index_jobs():
+    """
+    List indexing jobs (most recent first) with their progress.
+    """
+    return jsonify({"jobs": [job.to_dict() for job in index_jobs.list_jobs()]})
+
+
+@app.route('/index/jobs', methods=['POST'])
+def submit_index_job_route():
+    """
+    Start indexing a path in the background. Returns the job (an existing one if it already covers the path).
+    """
+    path = request.form.get('path') or (request.get_json(silent=True) or {}).get('path', '')
+    try:
+        job = submit_index_job(path)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(job.to_dict()), 202
+
+
+@app.route('/index/jobs/<int:job_id>', methods=['GET'])
+def index_job_progress(job_id):
+    """
+    Progress of one indexing job.
+    """
+    job = index_jobs.get_job(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/index/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_index_job(job_id):
+    """
+    Cancel a queued or running indexing job. Rows written so far are kept.
+    """
+    job = index_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+
 @app.route('/cache/stats')
 def cache_stats():
     """
@@ -142,6 +360,27 @@ def cache_stats():
     stats = search_selector.get_cache_stats()
     return jsonify(stats)
 
+@app.route('/db/stats')
+def db_stats():
+    """
+    Display database connection pool statistics.
+    """
+    return jsonify(db_connection.stats())
+
+@app.route('/db/explain')
+def db_explain():
+    """
+    Show which strategy a query uses and whether its plan falls back to sequential scans.
+    """
+    return jsonify(search_selector.explain(request.args.get('q', '')))
+
+@app.route('/watch/stats')
+def watch_stats():
+    """
+    Display file watcher statistics (backend, watched roots, changes applied).
+    """
+    return jsonify(file_watcher.stats())
+
 @app.route('/cache/clear', methods=['POST'])
 def clear_cache():
     """
@@ -151,10 +390,35 @@ def clear_cache():
     flash("Search cache cleared successfully")
     return redirect(url_for('home'))
 
+# Cache warm-up on startup: how many logged queries to replay, and where the cache is snapshotted on shutdown
+CACHE_WARMUP_TOP_N = int(os.getenv("CACHE_WARMUP_TOP_N", 50))
+CACHE_SNAPSHOT_PATH = os.getenv("CACHE_SNAPSHOT_PATH")
+
 def main():
-    schema_manager.init_database()
+    # In debug mode the reloader runs this in a parent process that only restarts the server;
+    # background services start in the serving child (WERKZEUG_RUN_MAIN), or two watchers would
+    # index every change
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_services()
     app.run(debug=True)
 
+def start_services():
+    schema_manager.init_database()
+    # Read once the schema exists (a fresh database has no index_state table before)
+    search_selector.generation = file_manager.get_generation()
+
+    # Restore the last snapshot if the index didn't change since, then warm up in the background
+    if CACHE_SNAPSHOT_PATH:
+        search_selector.load_snapshot(CACHE_SNAPSHOT_PATH)
+        atexit.register(search_selector.save_snapshot, CACHE_SNAPSHOT_PATH)
+    threading.Thread(target=search_selector.warm_up, args=(CACHE_WARMUP_TOP_N,), daemon=True).start()
+
+    if WATCH_ENABLED:
+        for path in WATCH_PATHS:
+            file_watcher.watch(path)
+        file_watcher.start()
+        atexit.register(file_watcher.stop)
+
 @app.errorhandler(Exception)
 def handle_exception(e):
     """Handle all uncaught exceptions"""
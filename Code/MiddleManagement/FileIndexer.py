@@ -1,59 +1,284 @@
-from pathlib import Path
 import datetime
+import os
+import queue
 import re
+import stat
 import logging
+import threading
 
 CONTENT_LIMIT = 10000
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_READER_WORKERS = 4
+DEFAULT_QUEUE_SIZE = 1000
+READABLE_EXTENSIONS = ['.txt', '.md', '.py', '.html', '.css', '.js', '.json', '.xml', '.csv']
+
+# Marks the end of a stage's output on the queues between stages
+_DONE = object()
 
 class FileIndexer:
-    
-    def __init__(self, db):
-        self.db = db 
+
+    def __init__(self, db, batch_size=DEFAULT_BATCH_SIZE, incremental=True, cleanup=True,
+                 reader_workers=DEFAULT_READER_WORKERS, queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        Indexing runs as a pipeline: one walker thread (os.scandir) feeds a pool of
+        reader threads (content + preview), which feed the writer (the calling thread)
+        that drains into the database. Bounded queues between the stages give backpressure.
+
+        Args:
+            db: An instance of FileManager.
+            batch_size: Rows per bulk upsert. 1 (or less) falls back to one add_file per file.
+            incremental: Skip files whose size/mtime match what's already in the database.
+            cleanup: Drop rows for files under the root that are gone. Incremental runs
+                diff against the snapshot; full runs anti-join the walked paths in the database.
+            reader_workers: Number of threads reading file contents.
+            queue_size: Capacity of each queue between the stages.
+        """
+        self.db = db
+        self.batch_size = batch_size
+        self.incremental = incremental
+        self.cleanup = cleanup
+        self.reader_workers = max(1, reader_workers)
+        self.queue_size = queue_size
         self.logger = logging.getLogger(__name__)
 
-    def index_path(self, path):
-        """Indexes recursively a folder and all the files and subfolders in it"""
-        path = Path(path)
+    def index_path(self, path, stats=None, cancel=None):
+        """
+        Indexes recursively a folder and all the files and subfolders in it
+
+        Args:
+            path: Folder to index
+            stats: Dictionary the counts are written to as the run progresses (for progress reports)
+            cancel: threading.Event that stops the run early. Rows written so far are kept,
+                but nothing is purged since the walk didn't see everything.
+
+        Returns:
+            Dictionary with counts: scanned, written, unchanged and removed files, bytes of
+            content read, and expected (files indexed under the path before the run, if known)
+        """
+        path = os.path.abspath(path)
         self.logger.info(f"Indexing path: {path}")
 
+        stats = stats if stats is not None else {}
+        stats.update({'scanned': 0, 'written': 0, 'unchanged': 0, 'removed': 0, 'bytes_read': 0,
+                      'expected': None})
+        cancel = cancel or threading.Event()
+        # One query up front instead of asking the database about every file
+        snapshot = self.db.get_file_snapshot(path) if self.incremental else {}
+        if self.incremental:
+            stats['expected'] = len(snapshot)
+        seen = set()
+        skipped_dirs = []
+
+        stop = threading.Event()
+        read_queue = queue.Queue(maxsize=self.queue_size)
+        write_queue = queue.Queue(maxsize=self.queue_size)
+        threads = [threading.Thread(target=self._walk_stage,
+                                    args=(path, snapshot, seen, skipped_dirs, stats, read_queue, stop),
+                                    daemon=True)]
+        threads += [threading.Thread(target=self._read_stage, args=(read_queue, write_queue, stop), daemon=True)
+                    for _ in range(self.reader_workers)]
+        for thread in threads:
+            thread.start()
+
+        try:
+            files = self._write_stage(write_queue, stats, cancel)
+            if self.batch_size <= 1:
+                for file_data in files:
+                    # The add_file method will trigger the search_vector update
+                    if not self.db.add_file(file_data):
+                        raise Exception("Cannot add to database, critical malfunction")
+            # Bulk mode: the pipeline is drained lazily, batch_size rows at a time
+            elif not self.db.add_files(files, batch_size=self.batch_size):
+                raise Exception("Cannot add to database, critical malfunction")
+        finally:
+            # Unblocks the walker and readers if the writer bailed out early
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        if cancel.is_set():
+            self.logger.info(f"Indexing of {path} cancelled: {stats}")
+            return stats
+        if self.cleanup:
+            stats['removed'] = self._remove_missing(path, snapshot, seen, skipped_dirs)
+
+        self.logger.info(f"Indexed {path}: {stats}")
+        return stats
+
+    def index_changes(self, paths, removed_dirs=()):
+        """
+        Brings the rows for a known set of changed paths up to date without walking the root
+        (used by the watcher). Rows under removed directories are purged first (a directory
+        can be removed and created again within one batch), then files are re-read and
+        upserted in one batch, paths that no longer exist are deleted and new directories
+        are indexed.
+
+        Args:
+            paths: Changed files or directories (existing or not)
+            removed_dirs: Directories known to be gone; everything indexed under them is purged
+
+        Returns:
+            Dictionary with counts: written and removed files
+        """
+        stats = {'written': 0, 'removed': 0}
+        for directory in removed_dirs:
+            stats['removed'] += self.db.purge_missing(directory, ())
+
+        files, missing = [], []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                missing.append(path)
+                continue
+            except OSError as e:
+                self.logger.error(f"Error indexing file {path}: {e}")
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                dir_stats = self.index_path(path)
+                stats['written'] += dir_stats['written']
+                stats['removed'] += dir_stats['removed']
+            elif stat.S_ISREG(st.st_mode):
+                try:
+                    files.append(self._build_file_data(path, st))
+                except Exception as e:
+                    self.logger.error(f"Error indexing file {path}: {e}")
+
+        if files:
+            if not self.db.add_files(files, batch_size=max(1, self.batch_size)):
+                raise Exception("Cannot add to database, critical malfunction")
+            stats['written'] += len(files)
+        if missing:
+            stats['removed'] += self.db.remove_files_by_path(missing)
+        return stats
+
+    def _remove_missing(self, root, snapshot, seen, skipped_dirs):
+        """
+        Whatever was indexed under root but wasn't met on this walk is gone.
+        Rows under directories we couldn't read are left alone.
+        """
+        if not self.incremental:
+            return self.db.purge_missing(root, seen, keep_roots=skipped_dirs)
+
+        skipped = tuple(os.path.join(d, '') for d in skipped_dirs)
+        missing = [p for p in snapshot
+                   if p not in seen and not (skipped and p.startswith(skipped))]
+        return self.db.remove_files_by_path(missing) if missing else 0
+
+    def _walk_stage(self, root, snapshot, seen, skipped_dirs, stats, read_queue, stop):
+        """
+        Walks a folder with os.scandir, queueing every new or changed file for the readers.
+        Paths met along the way are added to seen, unreadable directories to skipped_dirs.
+        """
+        stack = [root]
+        try:
+            while stack and not stop.is_set():
+                directory = stack.pop()
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            if entry.is_file():
+                                self._walk_file(entry, snapshot, seen, stats, read_queue, stop)
+                            elif entry.is_dir():
+                                stack.append(entry.path)  # Recurse into subdirectories
+                except PermissionError:
+                    self.logger.warning(f"Permission denied: {directory}")
+                    skipped_dirs.append(directory)
+                except Exception as e:
+                    self.logger.error(f"Error processing directory {directory}: {e}")
+                    skipped_dirs.append(directory)
+        finally:
+            for _ in range(self.reader_workers):
+                self._put(read_queue, _DONE, stop)
+
+    def _walk_file(self, entry, snapshot, seen, stats, read_queue, stop):
+        try:
+            st = entry.stat()  # The only stat of the file, reused by the reader
+        except OSError as e:
+            self.logger.error(f"Error indexing file {entry.path}: {e}")
+            return
+        seen.add(entry.path)
+        stats['scanned'] += 1
+
+        modified = datetime.datetime.fromtimestamp(st.st_mtime)
+        if snapshot.get(entry.path) == (st.st_size, modified):
+            stats['unchanged'] += 1
+            return
+        self._put(read_queue, (entry.path, st), stop)
+
+    def _read_stage(self, read_queue, write_queue, stop):
+        """Turns queued (path, stat) pairs into rows for the writer"""
         try:
-            for p in path.iterdir():
-                if p.is_file():
-                    try:
-                        file_data = {
-                            'path': str(p.absolute()),
-                            'filename': p.name,
-                            'extension': p.suffix.lstrip('.').lower(),  # Store without dot for better search
-                            'size': p.stat().st_size,
-                            'modified': datetime.datetime.fromtimestamp(p.stat().st_mtime),
-                            'created': datetime.datetime.fromtimestamp(p.stat().st_ctime),
-                        }
-                            
-                        # If the file is "readable", get content from it
-                        if p.suffix.lower() in ['.txt', '.md', '.py', '.html', '.css', '.js', '.json', '.xml', '.csv']:
-                            with open(p, 'r', encoding='utf-8', errors='ignore') as f:
-                                content = f.read()
-                                if len(content) > CONTENT_LIMIT:  # ~10KB limit
-                                    content = content[:CONTENT_LIMIT] + "... (truncated)"
-                                file_data['content'] = content
-                                
-                                # Extract first two paragraphs for preview
-                                paragraphs = re.split(r'\n\s*\n', content.strip(), maxsplit=2)
-                                file_data['preview'] = '\n\n'.join(paragraphs[:2]) if len(paragraphs) > 1 else paragraphs[0]
-
-                        # The add_file method will trigger the search_vector update
-                        if not self.db.add_file(file_data):
-                            raise Exception("Cannot add to database, critical malfunction")
-                            # self.logger.error(f"Failed to add file to database: {p}") # I don't know if we need this anymore.
-
-                    except Exception as e:
-                        raise Exception(f"Misc exception in indexing: {e}")
-                        # self.logger.error(f"Error indexing file {p}: {e}")
-
-                elif p.is_dir():
-                    self.index_path(p)  # Recurse into subdirectories
-                
-        except PermissionError:
-            self.logger.warning(f"Permission denied: {path}")
-        except Exception as e:
-            self.logger.error(f"Error processing directory {path}: {e}")
\ No newline at end of file
+            while True:
+                item = self._get(read_queue, stop)
+                if item is _DONE:
+                    break
+                try:
+                    file_data = self._build_file_data(*item)
+                except Exception as e:
+                    self.logger.error(f"Error indexing file {item[0]}: {e}")
+                    continue
+                self._put(write_queue, file_data, stop)
+        finally:
+            self._put(write_queue, _DONE, stop)
+
+    def _write_stage(self, write_queue, stats, cancel):
+        """Yields rows from the readers until every one of them is done, or the run is cancelled"""
+        finished = 0
+        while finished < self.reader_workers:
+            file_data = self._get(write_queue, cancel)
+            if cancel.is_set():
+                return
+            if file_data is _DONE:
+                finished += 1
+                continue
+            stats['written'] += 1
+            stats['bytes_read'] += len(file_data.get('content') or '')
+            yield file_data
+
+    @staticmethod
+    def _get(q, stop):
+        """Blocking get that returns _DONE once the run is stopped"""
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    @staticmethod
+    def _put(q, item, stop):
+        """Blocking put that gives up once the run is stopped"""
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _build_file_data(self, path, st):
+        """Builds the row for a single file, reading content from it if it is "readable" """
+        filename = os.path.basename(path)
+        suffix = os.path.splitext(filename)[1].lower()
+        file_data = {
+            'path': path,
+            'filename': filename,
+            'extension': suffix.lstrip('.'),  # Store without dot for better search
+            'size': st.st_size,
+            'modified': datetime.datetime.fromtimestamp(st.st_mtime),
+            'created': datetime.datetime.fromtimestamp(st.st_ctime),
+        }
+
+        # If the file is "readable", get content from it
+        if suffix in READABLE_EXTENSIONS:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read(CONTENT_LIMIT + 1)  # No need to read past the limit
+                if len(content) > CONTENT_LIMIT:  # ~10KB limit
+                    content = content[:CONTENT_LIMIT] + "... (truncated)"
+                file_data['content'] = content
+
+                # Extract first two paragraphs for preview
+                paragraphs = re.split(r'\n\s*\n', content.strip(), maxsplit=2)
+                file_data['preview'] = '\n\n'.join(paragraphs[:2]) if len(paragraphs) > 1 else paragraphs[0]
+
+        return file_data
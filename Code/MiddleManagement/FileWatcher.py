@@ -0,0 +1,446 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Dict, List, Any, Optional, Set, Tuple
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEBOUNCE = 1.0  # seconds without new events before a batch is written
+DEFAULT_MAX_DELAY = 10.0  # upper bound on how long a busy directory can hold a batch back
+DEFAULT_POLL_INTERVAL = 5.0
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+              | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, len (then len bytes of NUL-padded name)
+
+
+class _Inotify:
+    """Minimal ctypes binding of the Linux inotify API (no extra dependency)."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise self._error()
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise self._error(path)
+        return wd
+
+    def rm_watch(self, wd: int) -> None:
+        self._rm_watch(self.fd, wd)  # EINVAL if the kernel already dropped it; nothing to do
+
+    def read_events(self, timeout: float) -> List[Tuple[int, int, str]]:
+        """(wd, mask, name) for every event available within timeout seconds"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+    @staticmethod
+    def _error(path: Optional[str] = None) -> OSError:
+        code = ctypes.get_errno()
+        return OSError(code, os.strerror(code), path)
+
+
+class FileWatcher:
+    """
+    Keeps the index fresh between full index runs. Watches the indexed roots with Linux
+    inotify (one watch per directory), or by polling file stats where inotify isn't available
+    or runs out of watches. Events are debounced and coalesced per path, then written as one
+    batch per root through FileIndexer.index_changes, so FileManager bumps the index
+    generation and the search cache drops the entries under that root.
+    """
+
+    def __init__(self, indexer, backend: str = "auto", debounce: float = DEFAULT_DEBOUNCE,
+                 max_delay: float = DEFAULT_MAX_DELAY, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 jobs=None):
+        """
+        Args:
+            indexer: The FileIndexer changes are written through
+            backend: "inotify", "polling" or "auto" (inotify on Linux, polling elsewhere)
+            debounce: Seconds without new events before pending changes are written
+            max_delay: Longest time a change may wait while events keep coming
+            poll_interval: Seconds between two scans in polling mode
+            jobs: IndexJobScheduler that re-walks roots after lost events, so a rescan never runs
+                  next to a job on the same root (without one, they're re-walked in the watcher thread)
+        """
+        self.indexer = indexer
+        self.jobs = jobs
+        self.backend = backend
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.roots: List[str] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._inotify: Optional[_Inotify] = None
+        self._watches: Dict[int, str] = {}  # wd -> directory
+        self._watch_dirs: Dict[str, int] = {}  # directory -> wd
+        self._pending: Set[str] = set()
+        self._pending_removed_dirs: Set[str] = set()
+        # The batch being written: not pending anymore, not in the index yet
+        self._writing: Set[str] = set()
+        self._writing_removed_dirs: Set[str] = set()
+        self._first_event = 0.0
+        self._last_event = 0.0
+        self._poll_state: Dict[str, Tuple[int, int]] = {}  # file -> (size, mtime_ns), polling mode only
+        self._rescan: Set[str] = set()  # roots to re-walk after an inotify queue overflow
+        self._stats = {"events": 0, "batches": 0, "written": 0, "removed": 0, "overflows": 0, "errors": 0}
+
+    def watch(self, root: str) -> None:
+        """Starts watching a root (and everything below it). Roots already covered are ignored."""
+        root = os.path.abspath(root)
+        with self._lock:
+            if any(self._is_under(root, r) for r in self.roots):
+                return
+            # A new root covering old ones replaces them
+            self.roots = [r for r in self.roots if not self._is_under(r, root)] + [root]
+        if self._inotify is not None:
+            self._add_watches(root)
+        elif self._thread is not None:
+            self._poll_snapshot(root)
+        logger.info("Watching %s for changes", root)
+
+    def start(self) -> None:
+        """Starts the watcher thread."""
+        if self._thread is not None:
+            return
+        if self.backend != "polling":
+            try:
+                if not sys.platform.startswith("linux"):
+                    raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+                self._inotify = _Inotify()
+                for root in list(self.roots):
+                    self._add_watches(root)
+            except OSError as e:
+                if self.backend == "inotify":
+                    raise
+                logger.warning("inotify unavailable (%s), falling back to polling", e)
+                self._close_inotify()
+        if self._inotify is None:
+            for root in list(self.roots):
+                self._poll_snapshot(root)
+        self._thread = threading.Thread(target=self._run, name="FileWatcher", daemon=True)
+        self._thread.start()
+        logger.info("File watcher started (%s)", "inotify" if self._inotify else "polling")
+
+    def stop(self) -> None:
+        """Stops the watcher thread, writing the changes still pending."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._close_inotify()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["backend"] = "inotify" if self._inotify else "polling"
+            stats["roots"] = list(self.roots)
+            stats["watched_directories"] = len(self._watch_dirs)
+            stats["pending"] = len(self._pending) + len(self._pending_removed_dirs)
+        return stats
+
+    def pending_changes(self) -> Tuple[Set[str], Set[str]]:
+        """
+        Changes seen but not written to the index yet (pending or being written).
+
+        Returns:
+            (changed paths, removed directories); a changed path that no longer exists was deleted
+        """
+        with self._lock:
+            return (self._pending | self._writing,
+                    self._pending_removed_dirs | self._writing_removed_dirs)
+
+    def _run(self) -> None:
+        last_poll = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                if self._inotify is not None:
+                    self._read_inotify()
+                else:
+                    timeout = max(0.0, min(self._flush_in(), last_poll + self.poll_interval - time.monotonic()))
+                    if self._stop.wait(timeout):
+                        break
+                    if time.monotonic() - last_poll >= self.poll_interval:
+                        self._poll()
+                        last_poll = time.monotonic()
+                if self._flush_in() <= 0:
+                    self._flush()
+            except Exception as e:
+                with self._lock:
+                    self._stats["errors"] += 1
+                logger.error("File watcher error: %s", e)
+                self._stop.wait(1)
+        try:
+            self._flush()
+        except Exception as e:
+            logger.error("Changes still pending at shutdown were not written: %s", e)
+
+    def _flush_in(self) -> float:
+        """Seconds until the pending changes are due (infinity if nothing is pending)"""
+        with self._lock:
+            if not self._pending and not self._pending_removed_dirs and not self._rescan:
+                return float('inf')
+            return min(self._last_event + self.debounce, self._first_event + self.max_delay) - time.monotonic()
+
+    def _record(self, path: str, removed_dir: bool = False) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if not self._pending and not self._pending_removed_dirs:
+                self._first_event = now
+            self._last_event = now
+            self._stats["events"] += 1
+            if removed_dir:
+                if any(self._is_under(path, d) for d in self._pending_removed_dirs):
+                    return
+                self._pending_removed_dirs = {d for d in self._pending_removed_dirs if not self._is_under(d, path)}
+                self._pending_removed_dirs.add(path)
+                # Changes recorded below it are moot now
+                self._pending = {p for p in self._pending if not self._is_under(p, path)}
+            else:
+                # A removed directory that's back (rm -rf build && mkdir build) must not be purged
+                # after its new contents are written: it's indexed again as a whole instead
+                back = {d for d in self._pending_removed_dirs if self._is_under(path, d)}
+                self._pending_removed_dirs -= back
+                self._pending |= back
+                self._pending.add(path)
+
+    def _flush(self) -> None:
+        """Writes the pending changes, one batch per root so cache invalidation stays narrow"""
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            removed_dirs, self._pending_removed_dirs = self._pending_removed_dirs, set()
+            rescan, self._rescan = self._rescan, set()
+            roots = list(self.roots)
+            self._writing, self._writing_removed_dirs = set(pending), set(removed_dirs)
+        if not pending and not removed_dirs and not rescan:
+            return
+        try:
+            self._write(pending, removed_dirs, rescan, roots)
+        except Exception:
+            # Put back what wasn't written (writes are idempotent) and retry after a debounce
+            now = time.monotonic()
+            with self._lock:
+                self._pending |= pending
+                self._pending_removed_dirs |= removed_dirs
+                self._rescan |= rescan
+                self._first_event = self._last_event = now
+            raise
+        finally:
+            with self._lock:
+                self._writing, self._writing_removed_dirs = set(), set()
+
+    def _write(self, pending: Set[str], removed_dirs: Set[str], rescan: Set[str], roots: List[str]) -> None:
+        """Writes a batch, removing what was written from the sets: after a failure they hold the rest"""
+        for root in list(rescan):
+            # Events were lost; an incremental run re-reads only what changed
+            if self.jobs is not None:
+                self.jobs.submit(root)
+            else:
+                self._count_batch(self.indexer.index_path(root))
+            rescan.discard(root)
+            pending.difference_update([p for p in pending if self._is_under(p, root)])
+            removed_dirs.difference_update([d for d in removed_dirs if self._is_under(d, root)])
+
+        for root in roots:
+            paths = [p for p in pending if self._is_under(p, root)]
+            dirs = [d for d in removed_dirs if self._is_under(d, root)]
+            if paths or dirs:
+                self._count_batch(self.indexer.index_changes(paths, removed_dirs=dirs))
+                pending.difference_update(paths)
+                removed_dirs.difference_update(dirs)
+                logger.info("Applied %d changes under %s", len(paths) + len(dirs), root)
+
+    def _count_batch(self, stats: Dict[str, int]) -> None:
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["written"] += stats.get('written', 0)
+            self._stats["removed"] += stats.get('removed', 0)
+
+    # inotify backend
+
+    def _read_inotify(self) -> None:
+        inotify = self._inotify
+        if inotify is None:
+            return
+        timeout = min(self._flush_in(), 1.0)  # Wake up regularly to notice stop()
+        for wd, mask, name in inotify.read_events(max(0.0, timeout)):
+            if mask & IN_Q_OVERFLOW:
+                self._overflow()
+                continue
+            with self._lock:
+                directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                self._forget_watch(wd)
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                continue  # Reported as a delete/move by the parent directory already
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_watches(path)
+                    self._record(path)  # Indexed as a whole, files created before the watch included
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._remove_watches(path)
+                    self._record(path, removed_dir=True)
+            else:
+                self._record(path)
+
+    def _add_watches(self, root: str) -> None:
+        """Watches root and every directory below it"""
+        inotify = self._inotify
+        stack = [root]
+        while stack and inotify is not None:
+            directory = stack.pop()
+            try:
+                wd = inotify.add_watch(directory, WATCH_MASK)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    logger.warning("Out of inotify watches (fs.inotify.max_user_watches), falling back to polling")
+                    self._fall_back_to_polling()
+                    return
+                continue  # Gone or unreadable; the indexer skips it too
+            with self._lock:
+                self._watches[wd] = directory
+                self._watch_dirs[directory] = wd
+            try:
+                with os.scandir(directory) as entries:
+                    stack.extend(e.path for e in entries if e.is_dir(follow_symlinks=False))
+            except OSError:
+                pass
+
+    def _remove_watches(self, root: str) -> None:
+        """Stops watching a directory that moved away or vanished, and everything below it"""
+        with self._lock:
+            gone = [(d, wd) for d, wd in self._watch_dirs.items() if self._is_under(d, root)]
+        inotify = self._inotify
+        for directory, wd in gone:
+            if inotify is not None:
+                inotify.rm_watch(wd)
+            self._forget_watch(wd)
+
+    def _forget_watch(self, wd: int) -> None:
+        with self._lock:
+            directory = self._watches.pop(wd, None)
+            if directory is not None and self._watch_dirs.get(directory) == wd:
+                del self._watch_dirs[directory]
+
+    def _overflow(self) -> None:
+        logger.warning("inotify event queue overflowed, re-indexing the watched roots")
+        with self._lock:
+            self._stats["overflows"] += 1
+            self._rescan.update(self.roots)
+            if not self._pending and not self._pending_removed_dirs:
+                self._first_event = self._last_event = time.monotonic()
+
+    def _fall_back_to_polling(self) -> None:
+        self._close_inotify()
+        for root in list(self.roots):
+            self._poll_snapshot(root)
+        with self._lock:
+            self._rescan.update(self.roots)  # Whatever happened before the switch
+            self._first_event = self._last_event = time.monotonic()
+
+    def _close_inotify(self) -> None:
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        with self._lock:
+            self._watches.clear()
+            self._watch_dirs.clear()
+
+    # Polling backend
+
+    def _poll(self) -> None:
+        """Compares (size, mtime) of every file under the roots with the previous scan"""
+        for root in list(self.roots):
+            current = self._scan(root)
+            with self._lock:
+                previous = {p: v for p, v in self._poll_state.items() if self._is_under(p, root)}
+            changed = [p for p, v in current.items() if previous.get(p) != v]
+            changed += [p for p in previous if p not in current]
+            with self._lock:
+                for path in previous:
+                    del self._poll_state[path]
+                self._poll_state.update(current)
+            for path in changed:
+                self._record(path)
+
+    def _poll_snapshot(self, root: str) -> None:
+        current = self._scan(root)
+        with self._lock:
+            self._poll_state.update(current)
+
+    @staticmethod
+    def _scan(root: str) -> Dict[str, Tuple[int, int]]:
+        state = {}
+        stack = [root]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_file():
+                                st = entry.stat()
+                                state[entry.path] = (st.st_size, st.st_mtime_ns)
+                            elif entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        return state
+
+    @staticmethod
+    def _is_under(path: str, root: str) -> bool:
+        return path == root or path.startswith(os.path.join(root, ''))
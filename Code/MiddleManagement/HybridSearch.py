@@ -0,0 +1,246 @@
+from concurrent.futures import ThreadPoolExecutor, wait
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+
+from .IndexlessQuery.ContentGrep import grep_files
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 50
+DEFAULT_DEADLINE = 10.0
+DEFAULT_THREADS = 8
+# Changed files bigger than this aren't grepped for content searches
+MAX_GREP_FILE_SIZE = 10 * 1024 * 1024
+
+
+class HybridSearch:
+    """
+    Answers a prompt from the database index and, at the same time, from live indexless scans
+    of what the index doesn't know about yet:
+    - searched roots no index run went through are scanned whole;
+    - under indexed roots, only the changes the file watcher saw but didn't write yet are looked at
+      (changed files are matched one by one, new directories are scanned, deleted files are dropped).
+    Everything is merged into one list, de-duplicated by path (the index row wins, with the live
+    size and modified time) and ranked by how well the filename matches.
+    """
+
+    def __init__(self, selector, indexless: Callable[..., Iterable], indexed_roots: Callable[[], List[str]],
+                 pending_changes: Callable[[], Tuple[Set[str], Set[str]]], deadline: float = DEFAULT_DEADLINE,
+                 max_threads: int = DEFAULT_THREADS):
+        """
+        Args:
+            selector: The SearchSelector (or its caching proxy) answering from the index
+            indexless: indexless(query, path, limit, mode), the NDJSON lines of an indexless search
+            indexed_roots: Returns the roots the index covers
+            pending_changes: Returns (changed paths, removed directories) not written to the index yet
+            deadline: Seconds after which the live part ends with what it has, flagged as partial
+            max_threads: Threads running index lookups and scans across all searches
+        """
+        self.selector = selector
+        self.indexless = indexless
+        self.indexed_roots = indexed_roots
+        self.pending_changes = pending_changes
+        self.deadline = deadline
+        self._executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="hybrid")
+
+    def search(self, prompt: str, path: Optional[str] = None, limit: int = DEFAULT_LIMIT) -> Dict[str, Any]:
+        """
+        Args:
+            prompt: Search prompt, as for SearchSelector.search_prompt
+            path: Only search below this directory (default: the prompt's absolute path: qualifiers, if any)
+            limit: Maximum number of results
+
+        Returns:
+            {"results", "count", "partial", "errors", "sources": {"index", "live"}, "scanned",
+            "pending_changes"}; every result carries "source": "index" or "live"
+        """
+        live_query = self.selector.indexless_query(prompt)
+        scope = [path] if path else self.selector.scope(prompt) or []
+        roots = [os.path.abspath(p) for p in scope]
+        indexed = [os.path.abspath(r) for r in self.indexed_roots()]
+        changed, removed_dirs = self.pending_changes()
+
+        unindexed = [r for r in roots if not any(_is_under(r, i) for i in indexed) and os.path.isdir(r)]
+        # Under unindexed roots, changes are picked up by the scan anyway
+        changed = {p for p in changed
+                   if (not roots or any(_is_under(p, r) for r in roots))
+                   and not any(_is_under(p, r) for r in unindexed)}
+
+        stop = threading.Event()
+        # A separate path is added to the index query as one more path prefix
+        db_future = self._executor.submit(self.selector.search_prompt, prompt, limit=limit,
+                                          within=roots[0] if path else None)
+        scan_futures = []
+        changes_future = None
+        if live_query is not None:
+            scan_futures = [self._executor.submit(self._scan, live_query, root, limit, stop) for root in unindexed]
+            if changed:
+                changes_future = self._executor.submit(self._check_changes, live_query, changed, limit, stop)
+        futures = [db_future] + scan_futures + ([changes_future] if changes_future else [])
+        _, not_done = wait(futures, timeout=self.deadline)
+        stop.set()  # Scans still running end at their next line
+
+        errors = []
+        partial = bool(not_done)
+        if not_done:
+            errors.append({"path": None, "error": f"timed out after {self.deadline}s"})
+
+        db_rows = _result(db_future, errors) or []
+        live: List[Dict[str, Any]] = []
+        gone: Set[str] = set()
+        for future, root in zip(scan_futures, unindexed):
+            matches, summary = _result(future, errors) or ([], {})
+            live += matches
+            if not summary or summary.get("partial"):
+                partial = True
+                errors += summary.get("errors", []) if summary else [{"path": root, "error": "scan incomplete"}]
+        if changes_future is not None:
+            matches, gone, changes_partial = _result(changes_future, errors) or ([], set(), True)
+            live += matches
+            partial = partial or changes_partial
+        partial = partial or bool(errors)
+
+        merged: Dict[str, Dict[str, Any]] = {}
+        for row in db_rows:
+            row_path = row["path"]
+            # Deleted since it was indexed
+            if row_path in gone or any(_is_under(row_path, d) for d in removed_dirs):
+                continue
+            # Under a root that was only partly indexed, nobody reports deletions
+            if any(_is_under(row_path, r) for r in unindexed) and not os.path.exists(row_path):
+                continue
+            merged[os.path.normcase(row_path)] = dict(row, source="index")
+        for match in live:
+            if not _accepts(live_query, match):
+                continue
+            key = os.path.normcase(match["path"])
+            if key in merged:
+                merged[key].update({k: match[k] for k in ("size", "modified", "matches") if k in match})
+            else:
+                merged[key] = dict(match, source="live")
+
+        needle = live_query["query"].lower() if live_query and live_query["mode"] == "filename" else ""
+        # Stable sort: within a tier, index rows keep the database's ranking, live matches follow
+        results = sorted(merged.values(), key=lambda r: _tier(r["filename"], needle))[:limit]
+        live_count = sum(1 for r in results if r["source"] == "live")
+        logger.info("Hybrid search for '%s': %d results (%d live), %d roots scanned, %d pending changes",
+                    prompt, len(results), live_count, len(unindexed), len(changed))
+        return {
+            "results": results,
+            "count": len(results),
+            "partial": partial,
+            "errors": errors,
+            "sources": {"index": len(results) - live_count, "live": live_count},
+            "scanned": unindexed,
+            "pending_changes": len(changed),
+        }
+
+    def _scan(self, live_query: Dict[str, Any], root: str, limit: int,
+              stop: threading.Event) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Runs one indexless search; returns (matches, summary), summary empty if it was cut short"""
+        # Matches filtered afterwards can't be capped by the scan
+        filtered = live_query["words"] or live_query["extensions"] or live_query["path_terms"]
+        lines = self.indexless(live_query["query"], root, None if filtered else limit, live_query["mode"])
+        matches: List[Dict[str, Any]] = []
+        try:
+            for line in lines:
+                # Indexless streams send empty heartbeat lines while quiet, so this is checked
+                # at least every half second even when nothing matches
+                if stop.is_set():
+                    return matches, {}
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                if item.get("done"):
+                    return matches, item
+                matches.append(item)
+        finally:
+            close = getattr(lines, "close", None)
+            if close is not None:
+                close()  # Cancels the search if it's still running
+        return matches, {}
+
+    def _check_changes(self, live_query: Dict[str, Any], changed: Set[str], limit: int,
+                       stop: threading.Event) -> Tuple[List[Dict[str, Any]], Set[str], bool]:
+        """
+        Matches the changed paths the index hasn't seen yet.
+
+        Returns:
+            (matches, paths that no longer exist, whether it was cut short)
+        """
+        matches: List[Dict[str, Any]] = []
+        gone: Set[str] = set()
+        files: Dict[str, Dict[str, Any]] = {}
+        partial = False
+        for changed_path in changed:
+            if stop.is_set():
+                return matches, gone, True
+            try:
+                st = os.stat(changed_path)
+            except OSError:
+                gone.add(changed_path)
+                continue
+            if os.path.isdir(changed_path):
+                # A directory created or moved in: everything below it is new
+                found, summary = self._scan(live_query, changed_path, limit, stop)
+                matches += found
+                partial = partial or not summary or summary.get("partial", False)
+                continue
+            files[changed_path] = {"filename": os.path.basename(changed_path), "path": changed_path,
+                                   "size": st.st_size, "modified": st.st_mtime}
+
+        if live_query["mode"] == "content":
+            greppable = [p for p, f in files.items() if 0 < f["size"] <= MAX_GREP_FILE_SIZE]
+            for found_path, lines in grep_files(greppable, live_query["query"]):
+                matches.append(dict(files[found_path], matches=lines))
+        else:
+            query = live_query["query"].lower()
+            matches += [f for f in files.values() if query in f["filename"].lower()]
+        return matches, gone, partial
+
+
+def _result(future, errors: List[Dict[str, Any]]):
+    """A finished future's result, or None (with the error recorded) if it failed or isn't done"""
+    if not future.done():
+        return None
+    try:
+        return future.result()
+    except Exception as e:
+        logger.error("Hybrid search part failed: %s", e)
+        errors.append({"path": None, "error": str(e)})
+        return None
+
+
+def _accepts(live_query: Optional[Dict[str, Any]], match: Dict[str, Any]) -> bool:
+    """Whether a live match also satisfies the parts of the prompt the scan couldn't check"""
+    if live_query is None:
+        return False
+    filename = match["filename"].lower()
+    normalized_path = match["path"].replace('\\', '/').lower()
+    return (all(word in filename for word in live_query["words"])
+            and all(filename.endswith(f".{extension}") for extension in live_query["extensions"])
+            and all(term in normalized_path for term in live_query["path_terms"]))
+
+
+def _tier(filename: str, needle: str) -> int:
+    """0: the filename (or its stem) is the query, 1: starts with it, 2: contains it, 3: matched otherwise"""
+    if not needle:
+        return 3
+    filename = filename.lower()
+    if filename == needle or os.path.splitext(filename)[0] == needle:
+        return 0
+    if filename.startswith(needle):
+        return 1
+    if needle in filename:
+        return 2
+    return 3
+
+
+def _is_under(path: str, root: str) -> bool:
+    return path == root or path.startswith(os.path.join(root, ''))
@@ -0,0 +1,191 @@
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+DEFAULT_HISTORY = 100  # finished jobs kept for the job list
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class IndexJob:
+    """One indexing run of a root, with live counters from FileIndexer.index_path."""
+
+    def __init__(self, job_id: int, root: str):
+        self.id = job_id
+        self.root = root
+        self.status = QUEUED
+        self.stats: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.cancel = threading.Event()
+
+    @property
+    def active(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    def to_dict(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        elapsed = ((self.finished or time.time()) - self.started) if self.started else 0.0
+        scanned = stats.get('scanned', 0)
+        rate = scanned / elapsed if elapsed > 0 else 0.0
+        expected = stats.get('expected')
+        # Files fully handled (the walk runs ahead of the readers and the writer)
+        processed = stats.get('written', 0) + stats.get('unchanged', 0)
+        eta = None
+        # Only known for incremental runs, from the number of files indexed under the root last time
+        if self.status == RUNNING and expected and processed and elapsed > 0:
+            eta = max(0.0, (expected - processed) / (processed / elapsed))
+        return {
+            "id": self.id,
+            "root": self.root,
+            "status": self.status,
+            "error": self.error,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "elapsed_seconds": round(elapsed, 3),
+            "files_scanned": scanned,
+            "files_per_second": round(rate, 1),
+            "bytes_read": stats.get('bytes_read', 0),
+            "rows_written": stats.get('written', 0),
+            "unchanged": stats.get('unchanged', 0),
+            "removed": stats.get('removed', 0),
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+        }
+
+
+class IndexJobScheduler:
+    """
+    Runs FileIndexer.index_path in the background on a bounded pool of worker threads,
+    so indexing a large tree doesn't hold a request thread.
+    Submitting a root already covered by a queued or running job returns that job; a root that
+    covers queued jobs replaces them. Jobs on overlapping roots never run at the same time.
+    """
+
+    def __init__(self, indexer, max_workers=DEFAULT_WORKERS, history=DEFAULT_HISTORY):
+        """
+        Args:
+            indexer: The FileIndexer jobs run through
+            max_workers: Number of jobs running at the same time
+            history: Number of finished jobs kept for list_jobs
+        """
+        self.indexer = indexer
+        self.max_workers = max(1, max_workers)
+        self.history = history
+        self._jobs: "OrderedDict[int, IndexJob]" = OrderedDict()
+        self._ids = itertools.count(1)
+        self._condition = threading.Condition()
+        self._workers: List[threading.Thread] = []
+        self._indexed: List[str] = []  # Roots a job went through completely, kept past the history
+
+    def submit(self, root: str) -> IndexJob:
+        """
+        Queues a job for root, unless an active job already covers it (then that job is returned).
+        """
+        root = os.path.abspath(root)
+        with self._condition:
+            for job in self._jobs.values():
+                if job.active and self._is_under(root, job.root):
+                    logger.info("Indexing of %s is covered by job %d (%s)", root, job.id, job.root)
+                    return job
+            job = IndexJob(next(self._ids), root)
+            # Queued jobs under the new root would only redo part of its work
+            for other in self._jobs.values():
+                if other.status == QUEUED and self._is_under(other.root, root):
+                    other.status = CANCELLED
+                    other.error = f"Superseded by job {job.id}"
+                    other.finished = time.time()
+            self._jobs[job.id] = job
+            self._start_workers()
+            self._condition.notify_all()
+        logger.info("Queued indexing job %d for %s", job.id, root)
+        return job
+
+    def cancel(self, job_id: int) -> Optional[IndexJob]:
+        """Cancels a queued or running job. Returns the job, or None if it's unknown."""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status == QUEUED:
+                job.status = CANCELLED
+                job.finished = time.time()
+            job.cancel.set()  # A running job stops at its next file and reports cancelled
+            return job
+
+    def get_job(self, job_id: int) -> Optional[IndexJob]:
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[IndexJob]:
+        """Every known job, most recent first."""
+        with self._condition:
+            return list(reversed(self._jobs.values()))
+
+    def indexed_roots(self) -> List[str]:
+        """Roots indexed completely by a job since startup (nested roots are folded into their parent)."""
+        with self._condition:
+            return list(self._indexed)
+
+    def _start_workers(self) -> None:
+        """Starts worker threads lazily, up to max_workers (called with the lock held)"""
+        self._workers = [w for w in self._workers if w.is_alive()]
+        while len(self._workers) < self.max_workers:
+            worker = threading.Thread(target=self._work, name=f"IndexJob-{len(self._workers)}", daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _next_job(self) -> IndexJob:
+        """Waits for the oldest queued job whose root doesn't overlap a running one"""
+        with self._condition:
+            while True:
+                running = [j.root for j in self._jobs.values() if j.status == RUNNING]
+                for job in self._jobs.values():
+                    if job.status == QUEUED and not any(
+                            self._is_under(job.root, r) or self._is_under(r, job.root) for r in running):
+                        job.status = RUNNING
+                        job.started = time.time()
+                        return job
+                self._condition.wait()
+
+    def _work(self) -> None:
+        while True:
+            job = self._next_job()
+            logger.info("Indexing job %d started for %s", job.id, job.root)
+            try:
+                self.indexer.index_path(job.root, stats=job.stats, cancel=job.cancel)
+                status = CANCELLED if job.cancel.is_set() else DONE
+            except Exception as e:
+                logger.error("Indexing job %d failed: %s", job.id, e)
+                job.error = str(e)
+                status = FAILED
+            with self._condition:
+                job.status = status
+                job.finished = time.time()
+                if status == DONE and not any(self._is_under(job.root, r) for r in self._indexed):
+                    self._indexed = [r for r in self._indexed if not self._is_under(r, job.root)] + [job.root]
+                self._prune()
+                self._condition.notify_all()  # Jobs waiting on an overlapping root may run now
+            logger.info("Indexing job %d %s: %s", job.id, status, job.stats)
+
+    def _prune(self) -> None:
+        """Drops the oldest finished jobs past the history size (called with the lock held)"""
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self._jobs[job_id]
+
+    @staticmethod
+    def _is_under(path: str, root: str) -> bool:
+        return path == root or path.startswith(os.path.join(root, ''))
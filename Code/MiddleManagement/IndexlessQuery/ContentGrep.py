@@ -0,0 +1,86 @@
+import mmap
+import re
+
+DEFAULT_MAX_FILE_SIZE = 10 * 1024 * 1024
+DEFAULT_MAX_MATCHES = 5  # matching lines reported per file
+SNIPPET_CHARS = 120
+BINARY_SNIFF_BYTES = 8192  # a NUL byte in here marks the file as binary
+
+
+def compile_query(query, case_sensitive=False):
+    """
+    Byte pattern for a literal query (UTF-8). IGNORECASE on bytes only folds ASCII, so
+    case-insensitive patterns spell out the case variants of every other character.
+    """
+    if case_sensitive:
+        return re.compile(re.escape(query.encode('utf-8')))
+    return re.compile(b''.join(_fold(c) for c in query), re.IGNORECASE)
+
+
+def _fold(char):
+    """Pattern matching the UTF-8 encoding of any case variant of one character"""
+    if char.isascii():
+        return re.escape(char.encode('utf-8'))
+    variants = {char, char.lower(), char.upper(), char.casefold(), char.title()}
+    # Longest first, so a multi-character variant (e.g. "SS" for "ß") wins over a prefix of it
+    encoded = sorted((re.escape(v.encode('utf-8')) for v in variants), key=len, reverse=True)
+    return b'(?:' + b'|'.join(encoded) + b')' if len(encoded) > 1 else encoded[0]
+
+
+def grep_file(path, pattern, max_matches=DEFAULT_MAX_MATCHES, snippet_chars=SNIPPET_CHARS):
+    """
+    Searches one file through a read-only memory map.
+
+    Returns:
+        [{"line": line number, "snippet": text around the match}] for the first max_matches
+        matching lines; empty for binary files or files that can't be read
+    """
+    try:
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                if b'\0' in mm[:BINARY_SNIFF_BYTES]:
+                    return []
+                return _find_lines(mm, pattern, max_matches, snippet_chars)
+    except (OSError, ValueError):  # ValueError: empty files can't be mapped
+        return []
+
+
+def grep_files(paths, query, case_sensitive=False, max_matches=DEFAULT_MAX_MATCHES,
+               snippet_chars=SNIPPET_CHARS):
+    """
+    Runs in a pool process: greps a batch of files (sent together to keep IPC low).
+
+    Returns:
+        [(path, matches)] for the files that matched
+    """
+    pattern = compile_query(query, case_sensitive)
+    found = []
+    for path in paths:
+        matches = grep_file(path, pattern, max_matches, snippet_chars)
+        if matches:
+            found.append((path, matches))
+    return found
+
+
+def _find_lines(mm, pattern, max_matches, snippet_chars):
+    matches = []
+    line = 1
+    counted_to = 0
+    position = 0
+    while len(matches) < max_matches:
+        match = pattern.search(mm, position)
+        if match is None:
+            break
+        start = match.start()
+        line += mm[counted_to:start].count(b'\n')  # Each byte is counted once over the whole file
+        counted_to = start
+        line_start = mm.rfind(b'\n', 0, start) + 1
+        line_end = mm.find(b'\n', start)
+        if line_end == -1:
+            line_end = len(mm)
+        # Center the snippet on the match when the line is longer than the snippet
+        snippet_start = max(line_start, min(start - snippet_chars // 2, line_end - snippet_chars))
+        snippet = mm[snippet_start:min(line_end, snippet_start + snippet_chars)]
+        matches.append({"line": line, "snippet": snippet.decode('utf-8', errors='replace').strip()})
+        position = line_end + 1  # One report per line
+    return matches
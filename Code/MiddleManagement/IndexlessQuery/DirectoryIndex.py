@@ -0,0 +1,118 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_DIRECTORIES = 100000
+# Editing a file in place doesn't touch its directory's mtime, so listings are also rescanned
+# after this many seconds to keep the reported size/modified time from going stale for long
+DEFAULT_MAX_AGE = 60.0
+
+
+class _Listing:
+    __slots__ = ("mtime_ns", "scanned", "files", "subdirs")
+
+    def __init__(self, mtime_ns, scanned, files, subdirs):
+        self.mtime_ns = mtime_ns
+        self.scanned = scanned
+        self.files = files  # (filename, lowercase filename, full path, size, modified)
+        self.subdirs = subdirs
+
+
+class DirectoryIndex:
+    """
+    In-memory filename index of the directories a worker has searched, built with os.scandir.
+    Every directory is revalidated by its mtime (one stat) before its cached listing is used,
+    so only directories that changed are listed again. Bounded by directory count (LRU).
+    Walks the same way os.walk does: symlinked directories aren't followed, unreadable
+    directories are skipped.
+    """
+
+    def __init__(self, max_directories=DEFAULT_MAX_DIRECTORIES, max_age=DEFAULT_MAX_AGE):
+        self.max_directories = max_directories
+        self.max_age = max_age
+        self._listings = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.rescans = 0
+
+    def walk(self, search_path, recursive=True, directories=None, until=None, unvisited=None):
+        """
+        Yields (directory, files) for search_path and, if recursive, every directory below it.
+        directories, if given, gets {directory: mtime_ns} of every listing used, so callers can
+        tell later whether the results still hold.
+        With until (a time.monotonic() value), the walk stops once it's reached, after at least
+        search_path itself; the directories it didn't get to are appended to unvisited, each still
+        to be walked recursively.
+        """
+        stack = [search_path]
+        while stack:
+            directory = stack.pop()
+            listing = self.listing(directory)
+            if listing is None:
+                continue
+            if directories is not None:
+                directories[directory] = listing.mtime_ns
+            yield directory, listing.files
+            if recursive:
+                stack.extend(reversed(listing.subdirs))
+            if until is not None and stack and time.monotonic() >= until:
+                if unvisited is not None:
+                    unvisited.extend(reversed(stack))
+                return
+
+    def listing(self, directory):
+        """The (possibly cached) listing of one directory, or None if it can't be read"""
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            listing = self._listings.get(directory)
+            if listing is not None and listing.mtime_ns == mtime_ns and now - listing.scanned < self.max_age:
+                self._listings.move_to_end(directory)
+                self.hits += 1
+                return listing
+
+        listing = self._scan(directory, mtime_ns, now)
+        if listing is None:
+            return None
+        with self._lock:
+            self.rescans += 1
+            self._listings[directory] = listing
+            self._listings.move_to_end(directory)
+            while len(self._listings) > self.max_directories:
+                self._listings.popitem(last=False)
+        return listing
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.rescans
+            return {
+                "directories": len(self._listings),
+                "max_directories": self.max_directories,
+                "hits": self.hits,
+                "rescans": self.rescans,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    @staticmethod
+    def _scan(directory, mtime_ns, now):
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            if not entry.is_symlink():
+                                subdirs.append(entry.path)
+                            continue
+                        st = entry.stat()
+                    except OSError:
+                        continue  # Vanished or a broken link
+                    files.append((entry.name, entry.name.lower(), entry.path, st.st_size, st.st_mtime))
+        except OSError:
+            return None
+        return _Listing(mtime_ns, now, files, subdirs)
@@ -0,0 +1,228 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import json
+import queue
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+from .Scanner import scan_task
+from .WorkQueue import WorkQueue
+
+DEFAULT_DEADLINE = 15.0
+DEFAULT_TASKS_PER_LANE = 2
+# Longest a local pool process walks one task before handing back the directories left
+DEFAULT_SLICE_SECONDS = 0.25
+# Matches buffered between the scans and the client; scans wait when it's full
+STREAM_BUFFER = 1000
+
+# Put on the stream buffer by a driver when it has no tasks left
+_DRIVER_DONE = object()
+# Yielded by a transport while a scan is quiet, so its driver can notice the search ended
+HEARTBEAT = object()
+
+
+class HttpTransport:
+    """Sends tasks to SearchWorker processes over HTTP and reads their NDJSON streams."""
+
+    def __init__(self, workers, requests_per_worker=2, connect_timeout=2.0, timeout=10.0):
+        """
+        Args:
+            workers: Base URLs of the workers
+            requests_per_worker: Requests each worker gets at the same time from one search
+            connect_timeout: Seconds to connect to a worker
+            timeout: Seconds a worker may stay silent (it sends heartbeats while scanning)
+        """
+        self.workers = workers
+        self.lanes = [worker for worker in workers for _ in range(requests_per_worker)]
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self._sessions = threading.local()
+
+    def scan(self, worker, query, task, limit=None, mode="filename", report_directories=False):
+        """
+        Yields a worker's matches as its stream delivers them, and HEARTBEAT for every heartbeat
+        line; closing the generator hangs up on it. With report_directories, a complete scan ends with {"directories": {directory: mtime_ns}}.
+        """
+        params = {"q": query, "path": task.path, "recursive": "1" if task.recursive else "0",
+                  "stream": "1", "mode": mode}
+        if limit:
+            params["limit"] = limit
+        if report_directories:
+            params["directories"] = "1"
+        with self._session().get(f"{worker}/api/search", params=params, stream=True,
+                                 timeout=(self.connect_timeout, self.timeout)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                yield json.loads(line) if line else HEARTBEAT
+
+    def _session(self):
+        """One keep-alive session per driver thread (requests.Session isn't thread-safe)"""
+        session = getattr(self._sessions, "session", None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=len(self.workers), pool_maxsize=len(self.workers))
+            session.mount("http://", adapter)
+            self._sessions.session = session
+        return session
+
+
+class LocalTransport:
+    """
+    Runs tasks with the workers' scan logic in a local process pool: no HTTP and no JSON,
+    matches come back pickled over the pool's pipes. Each pool process keeps its own
+    DirectoryIndex, so repeated searches stay fast.
+    A task only runs for a time slice; the directories it didn't get to come back as
+    {"unvisited": [...]} and are queued again, so matches arrive as slices finish and a search
+    that ended (limit, deadline, client gone) stops within a slice.
+    """
+
+    def __init__(self, processes, slice_seconds=DEFAULT_SLICE_SECONDS):
+        self.lanes = ["local"] * processes
+        self.slice_seconds = slice_seconds
+        self._pool = ProcessPoolExecutor(max_workers=processes)
+
+    def scan(self, lane, query, task, limit=None, mode="filename", report_directories=False):
+        future = self._pool.submit(scan_task, query, task.path, task.recursive, limit, mode, report_directories,
+                                   self.slice_seconds)
+        try:
+            yield from future.result()
+        finally:
+            future.cancel()  # Only helps if it hadn't started; a started task is small and runs out
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class IndexlessSearch:
+    """
+    Splits a tree into non-overlapping tasks (WorkQueue) and runs them on a transport, one
+    driver thread per lane, streaming matches as NDJSON as soon as they arrive.
+    Complete searches are kept in an optional ResultCache and served from it while none
+    of the directories they listed changed.
+    """
+
+    def __init__(self, transport, deadline=DEFAULT_DEADLINE, tasks_per_lane=DEFAULT_TASKS_PER_LANE,
+                 max_threads=None, cache=None):
+        """
+        Args:
+            transport: HttpTransport or LocalTransport
+            deadline: Seconds after which a search ends with what it has, flagged as partial
+            tasks_per_lane: Directories are split until the queue holds this many tasks per lane
+            max_threads: Driver threads across all searches (default: two searches' worth)
+            cache: Optional ResultCache
+        """
+        self.transport = transport
+        self.cache = cache
+        self.deadline = deadline
+        self.tasks_per_lane = tasks_per_lane
+        self._executor = ThreadPoolExecutor(max_workers=max_threads or 2 * len(transport.lanes),
+                                            thread_name_prefix="fan-out")
+
+    def stream(self, query, path, limit=None, mode="filename"):
+        """
+        Yields NDJSON lines: one match per line, in the order they are found, then a summary
+        {"done": true, "count", "partial", "errors"}. With limit, the search stops (and outstanding
+        scans are cancelled) once that many were sent. Closing the generator cancels the search too.
+        While no match arrives, an empty line is sent every half second (the workers' heartbeat),
+        so readers can give up on a quiet search without waiting for its next match.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(query, path, mode)
+            if cached is not None:
+                lines = cached[:limit] if limit else cached
+                yield from lines
+                yield json.dumps({"done": True, "count": len(lines), "partial": False, "errors": [],
+                                  "cached": True}) + "\n"
+                return
+
+        lanes = self.transport.lanes
+        # Idle lanes pull the next piece of the tree, biggest first; directories are split further
+        # whenever the queue runs low, so nobody idles on skewed trees
+        work = WorkQueue(path, target_tasks=self.tasks_per_lane * len(lanes))
+        matches = queue.Queue(maxsize=STREAM_BUFFER)
+        stop = threading.Event()
+        errors = []
+        report_directories = self.cache is not None
+        directories = {}
+
+        def put(item):
+            """Blocking put that gives up once the client has enough (or went away)"""
+            while not stop.is_set():
+                try:
+                    matches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def drive(lane):
+            try:
+                while not stop.is_set():
+                    task = work.next_task()
+                    if task is None:
+                        return
+                    unvisited = []
+                    stream = self.transport.scan(lane, query, task, limit, mode, report_directories)
+                    try:
+                        for match in stream:
+                            # Checked on heartbeats too: a scan finding nothing is hung up on as well
+                            if stop.is_set():
+                                break
+                            if match is HEARTBEAT:
+                                continue
+                            if "directories" in match:
+                                directories.update(match["directories"])
+                                continue
+                            if "unvisited" in match:
+                                unvisited = match["unvisited"]
+                                continue
+                            if not put(match):
+                                break
+                    except Exception as e:
+                        print(f"Error with {lane} searching {task.path}: {e}")
+                        errors.append({"worker": lane, "path": task.path, "error": str(e)})
+                    finally:
+                        stream.close()  # Ends the scan if it's still running
+                        work.task_done(unvisited)
+            finally:
+                put(_DRIVER_DONE)
+
+        drivers = [self._executor.submit(drive, lane) for lane in lanes]
+
+        deadline = time.monotonic() + self.deadline
+        count = 0
+        sent = [] if report_directories else None  # Kept for the cache
+        finished = 0
+        timed_out = False
+        try:
+            while finished < len(drivers) and not (limit and count >= limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    timed_out = True
+                    break
+                try:
+                    item = matches.get(timeout=min(remaining, 0.5))
+                except queue.Empty:
+                    yield "\n"
+                    continue
+                if item is _DRIVER_DONE:
+                    finished += 1
+                    continue
+                count += 1
+                line = json.dumps(item) + "\n"
+                if sent is not None:
+                    sent.append(line)
+                yield line
+        finally:
+            # Enough results, deadline, or the client hung up: cancel whatever is still running
+            stop.set()
+            unsearched = work.close()
+        if timed_out:
+            print(f"Search deadline of {self.deadline}s reached, returning partial results")
+            errors.extend({"worker": None, "path": task.path, "error": "timed out"} for task in unsearched)
+        # Only searches that saw the whole tree can answer the same search later
+        elif sent is not None and not errors and not (limit and count >= limit):
+            self.cache.set(query, path, mode, sent, dict(directories))
+        yield json.dumps({"done": True, "count": count, "partial": bool(errors) or timed_out,
+                          "errors": list(errors)}) + "\n"
@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_RESULTS = 200000  # matches kept across all entries
+DEFAULT_MAX_AGE = 300.0
+# File contents can change without touching any directory mtime, so content results expire sooner
+DEFAULT_CONTENT_MAX_AGE = 30.0
+
+
+class _Entry:
+    __slots__ = ("lines", "directories", "created")
+
+    def __init__(self, lines, directories, created):
+        self.lines = lines  # NDJSON lines, ready to send again
+        self.directories = directories  # {directory: mtime_ns} the scans listed
+        self.created = created
+
+
+class ResultCache:
+    """
+    Merged results of complete indexless searches, keyed by (query, root, mode).
+    Before a hit is served, every directory the scans listed is stat'ed again: if one changed
+    (file created, deleted or renamed in it) or is gone, the entry is dropped. That's one stat
+    per directory instead of a listing of every directory and a match of every name.
+    Bounded by entry count and total number of matches (LRU).
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_results=DEFAULT_MAX_RESULTS,
+                 max_age=DEFAULT_MAX_AGE, content_max_age=DEFAULT_CONTENT_MAX_AGE):
+        """
+        Args:
+            max_entries: Maximum number of cached searches
+            max_results: Maximum number of matches across all cached searches
+            max_age: Seconds a filename search stays cached (sizes and mtimes of matches may go stale)
+            content_max_age: Seconds a content search stays cached
+        """
+        self.max_entries = max_entries
+        self.max_results = max_results
+        self.max_age = max_age
+        self.content_max_age = content_max_age
+        self._entries = OrderedDict()
+        self._results = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._evictions = 0
+
+    def get(self, query, root, mode):
+        """The cached NDJSON lines for a search, or None if missing or no longer valid"""
+        key = (query.lower(), root, mode)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            max_age = self.content_max_age if mode == "content" else self.max_age
+            if time.monotonic() - entry.created < max_age and self._still_valid(entry.directories):
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                    self._hits += 1
+                return entry.lines
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    self._drop(key)
+                self._invalidations += 1
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def set(self, query, root, mode, lines, directories):
+        if len(lines) > self.max_results:
+            return
+        key = (query.lower(), root, mode)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(lines, directories, time.monotonic())
+            self._results += len(lines)
+            while len(self._entries) > self.max_entries or self._results > self.max_results:
+                self._drop(next(iter(self._entries)))
+                self._evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "results": self._results,
+                "max_results": self.max_results,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self._invalidations,
+                "evictions": self._evictions,
+            }
+
+    def _drop(self, key):
+        self._results -= len(self._entries.pop(key).lines)
+
+    @staticmethod
+    def _still_valid(directories):
+        for directory, mtime_ns in directories.items():
+            try:
+                if os.stat(directory).st_mtime_ns != mtime_ns:
+                    return False
+            except OSError:
+                return False
+        return True
@@ -0,0 +1,157 @@
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import os
+import threading
+import time
+
+try:
+    from .DirectoryIndex import DirectoryIndex
+    from .ContentGrep import grep_files
+except ImportError:
+    # Imported by SearchWorker started as a script
+    from DirectoryIndex import DirectoryIndex
+    from ContentGrep import grep_files
+
+# The scan logic shared by the HTTP workers (SearchWorker) and the local transport (Dispatcher)
+
+# Longest a content scan waits on the grep pool before yielding (an empty chunk), so callers
+# can send heartbeats and notice cancellation
+HEARTBEAT_INTERVAL = 1.0
+
+# Listings of the directories this process searched, reused while their mtime doesn't change
+directory_index = DirectoryIndex(
+    max_directories=int(os.getenv("INDEXLESS_WORKER_MAX_DIRECTORIES", 100000)),
+    max_age=float(os.getenv("INDEXLESS_WORKER_LISTING_MAX_AGE", 60)))
+
+# Content mode: processes grepping file bodies, files sent per task, files bigger than this are skipped
+GREP_PROCESSES = int(os.getenv("INDEXLESS_GREP_PROCESSES", os.cpu_count() or 2))
+GREP_BATCH_FILES = 64
+GREP_MAX_FILE_SIZE = int(os.getenv("INDEXLESS_GREP_MAX_FILE_SIZE", 10 * 1024 * 1024))
+
+grep_pool = None
+grep_pool_lock = threading.Lock()
+
+def get_grep_pool():
+    """Started on the first content search, so filename-only workers don't pay for it"""
+    global grep_pool
+    with grep_pool_lock:
+        if grep_pool is None:
+            grep_pool = ProcessPoolExecutor(max_workers=GREP_PROCESSES)
+        return grep_pool
+
+def iter_matches(query, search_path, recursive=True, mode="filename", grep_inline=False, directories=None,
+                 until=None, unvisited=None):
+    """
+    directories, if given, gets {directory: mtime_ns} of every directory scanned.
+    until and unvisited bound the walk in time (see DirectoryIndex.walk).
+    """
+    if mode == "content":
+        return iter_content_matches(query, search_path, recursive, grep_inline, directories, until, unvisited)
+    return iter_filename_matches(query, search_path, recursive, directories, until, unvisited)
+
+def iter_filename_matches(query, search_path, recursive=True, directories=None, until=None, unvisited=None):
+    """
+    Yields the matches one directory at a time (lists, possibly empty).
+    recursive=False only searches the files directly in search_path; its subdirectories are other tasks.
+    """
+    query = query.lower()
+    for _, files in directory_index.walk(search_path, recursive, directories, until, unvisited):
+        # Size and mtime come from the listing's stat, no extra syscalls per match
+        yield [{"filename": filename, "path": full_path, "size": size, "modified": modified}
+               for filename, lowered, full_path, size, modified in files if query in lowered]
+
+def iter_content_matches(query, search_path, recursive=True, grep_inline=False, directories=None,
+                         until=None, unvisited=None):
+    """
+    Yields files whose content contains query (case-insensitive), a batch at a time, each with
+    the first matching lines ({"line", "snippet"}). Files are grepped through mmap by a process
+    pool; empty files and files over GREP_MAX_FILE_SIZE are skipped without being opened, binary
+    files after their first few KB. Closing the generator cancels the batches not started yet.
+    grep_inline greps in this process instead, for callers that already are a pool process.
+    """
+    if grep_inline:
+        yield from _iter_content_inline(query, search_path, recursive, directories, until, unvisited)
+        return
+
+    pool = get_grep_pool()
+    in_flight = {}
+    max_in_flight = 2 * GREP_PROCESSES
+
+    def collect(done):
+        matches = []
+        for future in done:
+            matches += _content_results(future.result(), in_flight.pop(future))
+        return matches
+
+    try:
+        for batch in _content_batches(search_path, recursive, directories, until, unvisited):
+            if not batch:
+                yield []  # Keeps the heartbeat going while batches fill up
+                continue
+            in_flight[pool.submit(grep_files, list(batch), query)] = batch
+            # Backpressure: never more than a couple of batches queued per process
+            done, _ = wait(in_flight, timeout=0 if len(in_flight) < max_in_flight else None,
+                           return_when=FIRST_COMPLETED)
+            yield collect(done)
+        while in_flight:
+            done, _ = wait(in_flight, timeout=HEARTBEAT_INTERVAL, return_when=FIRST_COMPLETED)
+            yield collect(done)
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+def _iter_content_inline(query, search_path, recursive, directories, until, unvisited):
+    for batch in _content_batches(search_path, recursive, directories, until, unvisited):
+        yield _content_results(grep_files(list(batch), query), batch) if batch else []
+
+def _content_batches(search_path, recursive, directories, until=None, unvisited=None):
+    """Yields {path: (filename, size, modified)} batches of GREP_BATCH_FILES files, or {} after a directory that didn't fill one"""
+    batch = {}
+    for _, files in directory_index.walk(search_path, recursive, directories, until, unvisited):
+        for filename, _, full_path, size, modified in files:
+            if 0 < size <= GREP_MAX_FILE_SIZE:
+                batch[full_path] = (filename, size, modified)
+        if len(batch) < GREP_BATCH_FILES:
+            yield {}
+            continue
+        yield batch
+        batch = {}
+    if batch:
+        yield batch
+
+def _content_results(found, batch):
+    matches = []
+    for path, lines in found:
+        filename, size, modified = batch[path]
+        matches.append({"filename": filename, "path": path, "size": size,
+                        "modified": modified, "matches": lines})
+    return matches
+
+def search_files(query, search_path, recursive=True, limit=None, mode="filename", grep_inline=False,
+                 directories=None, until=None, unvisited=None):
+    matches = []
+    for chunk in iter_matches(query, search_path, recursive, mode, grep_inline, directories, until, unvisited):
+        matches.extend(chunk)
+        if limit and len(matches) >= limit:
+            return matches[:limit]
+    return matches
+
+def scan_task(query, search_path, recursive=True, limit=None, mode="filename", report_directories=False,
+              max_seconds=None):
+    """
+    Entry point for the local transport: one task, run in a pool process, results returned over its pipe.
+    With max_seconds, the walk stops after about that long and {"unvisited": [directories]} lists what
+    is left to search (recursively), so a big subtree comes back in slices instead of all at the end.
+    With report_directories, the last item is {"directories": {directory: mtime_ns}}, like the HTTP workers send.
+    """
+    directories = {} if report_directories else None
+    until = time.monotonic() + max_seconds if max_seconds else None
+    unvisited = []
+    matches = search_files(query, search_path, recursive, limit, mode, grep_inline=True, directories=directories,
+                           until=until, unvisited=unvisited)
+    if limit and len(matches) >= limit:
+        return matches
+    if unvisited:
+        matches.append({"unvisited": unvisited})
+    if report_directories:
+        matches.append({"directories": directories})
+    return matches
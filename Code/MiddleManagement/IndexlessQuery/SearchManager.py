@@ -2,20 +2,40 @@ import atexit
 from multiprocessing import Manager
 import subprocess
 import sys
-from flask import Flask, request, jsonify
-import requests
+from flask import Flask, Response, request, jsonify
 import os
 
+from .Dispatcher import HttpTransport, IndexlessSearch
+from .ResultCache import ResultCache
+
 app = Flask(__name__)
 
 PORT = 5001
 WORKER_PORTS = [5002, 5003, 5004]
 WORKERS = [f"http://localhost:{port}" for port in WORKER_PORTS]
 
+# Seconds to connect to / wait for one worker's answer, and for the whole search;
+# past the deadline whatever arrived is returned, flagged as partial
+WORKER_CONNECT_TIMEOUT = float(os.getenv("INDEXLESS_WORKER_CONNECT_TIMEOUT", 2))
+WORKER_TIMEOUT = float(os.getenv("INDEXLESS_WORKER_TIMEOUT", 10))
+SEARCH_DEADLINE = float(os.getenv("INDEXLESS_SEARCH_DEADLINE", 15))
+# Requests each worker is sent at the same time by one search, and across all searches
+REQUESTS_PER_WORKER = int(os.getenv("INDEXLESS_REQUESTS_PER_WORKER", 2))
+MAX_CONCURRENT_REQUESTS = int(os.getenv("INDEXLESS_MAX_CONCURRENT_REQUESTS", 4 * len(WORKERS)))
+# Directories are split until the queue holds this many tasks per worker
+TASKS_PER_WORKER = int(os.getenv("INDEXLESS_TASKS_PER_WORKER", 4))
+
 worker_processes = []
 
-# Be advised, no caching has been implemented yet. 
-# TODO: Cache search results and query for subsequenct searches
+# Every assignment is sent from a shared pool of driver threads, so all workers search at the same time
+indexless_search = IndexlessSearch(
+    HttpTransport(WORKERS, requests_per_worker=REQUESTS_PER_WORKER,
+                  connect_timeout=WORKER_CONNECT_TIMEOUT, timeout=WORKER_TIMEOUT),
+    deadline=SEARCH_DEADLINE,
+    tasks_per_lane=max(1, TASKS_PER_WORKER // REQUESTS_PER_WORKER),
+    max_threads=MAX_CONCURRENT_REQUESTS,
+    cache=ResultCache(max_entries=int(os.getenv("INDEXLESS_CACHE_MAX_ENTRIES", 256)),
+                      max_results=int(os.getenv("INDEXLESS_CACHE_MAX_RESULTS", 200000))))
 
 def start_workers():
     worker_file = os.path.join(os.path.dirname(__file__), "SearchWorker.py")
@@ -36,49 +56,27 @@ def cleanup_workers():
 # The complete path would be localhost:PORT/api/search (hope)
 @app.route("/api/search", methods=["GET"])
 def api_search():
+    """
+    Streams matches as NDJSON, one per line, in the order workers find them.
+    The last line is a summary: {"done": true, "count", "partial", "errors"}.
+    With limit, the search stops (and outstanding worker scans are cancelled) once that many were sent.
+    mode=content matches file contents instead of names; matches then carry their matching lines.
+    """
     query = request.args.get('q', '')
     path = request.args.get('path', '')
+    limit = request.args.get('limit', type=int)
+    mode = request.args.get('mode', 'filename')
+    if mode not in ("filename", "content"):
+        return jsonify({"error": f"Unknown mode: {mode}"}), 400
     
-    # Get top-level directories to distribute
-    try:
-        # Subdirs is the list of paths + specific something in that directory
-        # If that "something" is a directory
-        subdirs = [os.path.join(path, d) for d in os.listdir(path) 
-                  if os.path.isdir(os.path.join(path, d))]
-        
-        # Include base path for files in the root directory
-        subdirs.append(path)
-    except Exception as e:
-        return jsonify({"error": f"Error reading directory: {str(e)}"}), 400
-    
-    # Distribute directories among workers
-    worker_dirs = {}
-    for i, subdir in enumerate(subdirs):
-        worker_idx = i % len(WORKERS)
-        # Initialize the lists of tasks for each of the workers
-        if WORKERS[worker_idx] not in worker_dirs:
-            worker_dirs[WORKERS[worker_idx]] = []
+    if not os.path.isdir(path):
+        return jsonify({"error": f"Error reading directory: {path} is not a directory"}), 400
 
-        worker_dirs[WORKERS[worker_idx]].append(subdir)
-    
-    # Query workers with their assigned directories
-    results = []
-    for worker, dirs in worker_dirs.items():
-        for dir_path in dirs:
-            try:
-                response = requests.get(
-                    f"{worker}/api/search", 
-                    params={"q": query, "path": dir_path}
-                )
-                if response.status_code == 200:
-                    worker_results = response.json().get("results", [])
-                    results.extend(worker_results)
-            except Exception as e:
-                print(f"Error with {worker} searching {dir_path}: {e}")
-    
-    # Sorting the results by filename
-    results.sort(key=lambda x: x.get("filename", ""))
-    return jsonify({"results": results})
+    return Response(indexless_search.stream(query, path, limit, mode), mimetype="application/x-ndjson")
+
+@app.route("/api/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify(indexless_search.cache.stats())
 
 def main():
     start_workers()
@@ -1,32 +1,62 @@
-from flask import Flask, request, jsonify
-import os
+from flask import Flask, Response, request, jsonify
+import json
 import sys
+import time
+
+try:
+    from .Scanner import HEARTBEAT_INTERVAL, directory_index, iter_matches, search_files
+except ImportError:
+    # Started as a script by the manager
+    from Scanner import HEARTBEAT_INTERVAL, directory_index, iter_matches, search_files
 
 app = Flask(__name__)
 
 PORT = int(sys.argv[1])
 
-def search_files(query, search_path):
-    matches = []
-    for root, _, files in os.walk(search_path):
-        for filename in files:
-            full_path = os.path.join(root, filename)
-            if query.lower() in filename.lower():
-                matches.append({
-                    "filename": filename,
-                    "path": full_path,
-                    "size": os.path.getsize(full_path),
-                    "modified": os.path.getmtime(full_path)
-})
-    return matches
+def stream_matches(query, search_path, recursive=True, limit=None, mode="filename", report_directories=False):
+    """
+    NDJSON: one match per line, flushed after every directory (or grep batch) that had matches.
+    A scan quiet for HEARTBEAT_INTERVAL sends an empty line, so the manager's read timeout
+    doesn't fire on long quiet stretches and a client that went away is noticed.
+    With report_directories, a complete scan ends with {"directories": {directory: mtime_ns}}
+    (used by the manager to tell whether cached results still hold).
+    """
+    sent = 0
+    last_flush = time.monotonic()
+    directories = {} if report_directories else None
+    for chunk in iter_matches(query, search_path, recursive, mode, directories=directories):
+        if limit:
+            chunk = chunk[:limit - sent]
+        if chunk:
+            sent += len(chunk)
+            last_flush = time.monotonic()
+            yield ''.join(json.dumps(match) + '\n' for match in chunk)
+            if limit and sent >= limit:
+                return  # Closing the generator stops the walk
+        elif time.monotonic() - last_flush >= HEARTBEAT_INTERVAL:
+            last_flush = time.monotonic()
+            yield '\n'
+    if report_directories:
+        yield json.dumps({"directories": directories}) + '\n'
 
 @app.route("/api/search", methods=["GET"])
 def search():
     query = request.args.get("q")
     path = request.args.get("path")
-    results = search_files(query, path)
+    recursive = request.args.get("recursive", "1") != "0"
+    limit = request.args.get("limit", type=int)
+    mode = request.args.get("mode", "filename")  # "content" greps file bodies
+    if request.args.get("stream") == "1":
+        report_directories = request.args.get("directories") == "1"
+        return Response(stream_matches(query, path, recursive, limit, mode, report_directories),
+                        mimetype="application/x-ndjson")
+    results = search_files(query, path, recursive, limit, mode)
     return jsonify({"results": results})
 
+@app.route("/api/index/stats", methods=["GET"])
+def index_stats():
+    return jsonify(directory_index.stats())
+
 if __name__ == "__main__":
     app.run(port=PORT)
     print(f"Worker running on port: {PORT}")
@@ -0,0 +1,128 @@
+import heapq
+import itertools
+import os
+import threading
+
+
+class SearchTask:
+    """
+    A piece of the tree for one worker request: a directory searched recursively,
+    or only the files directly in it (recursive=False).
+    """
+
+    def __init__(self, path, recursive=True, size=0):
+        self.path = path
+        self.recursive = recursive
+        # A cheap stand-in for the task's cost: files directly in the directory for files-only tasks,
+        # the directory's link count (2 + its subdirectories on most filesystems) for subdirectory tasks
+        self.size = size
+
+    def __repr__(self):
+        return f"SearchTask({self.path!r}, recursive={self.recursive}, size={self.size})"
+
+
+class WorkQueue:
+    """
+    Shared queue the worker drivers pull tasks from, largest first.
+    Tasks never overlap: splitting a directory turns it into a files-only task for the
+    directory itself plus one recursive task per subdirectory. Splitting happens on demand,
+    when a task is taken while fewer than target_tasks are left, so a skewed tree (one huge
+    node_modules) keeps being cut up for as long as idle workers would otherwise wait.
+    Directories are listed outside the lock, so other drivers aren't held up by the disk.
+    """
+
+    def __init__(self, root, target_tasks):
+        """
+        Args:
+            root: Directory to search
+            target_tasks: Queue length below which taken tasks are split further
+        """
+        self.target_tasks = target_tasks
+        self._heap = []
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._in_progress = 0  # Tasks handed out and not reported done yet
+        self._closed = False
+        self.splits = 0
+        self._push(SearchTask(root, recursive=True))
+
+    def next_task(self):
+        """
+        The next task to send, or None when there is nothing left (or the queue is closed).
+        Every task handed out must be reported with task_done; while some are outstanding, an
+        empty queue waits for them, since they may hand back directories they didn't get to.
+        """
+        with self._lock:
+            while True:
+                if self._closed:
+                    return None
+                if self._heap:
+                    break
+                if not self._in_progress:
+                    return None
+                self._changed.wait()
+            self._in_progress += 1
+            task = heapq.heappop(self._heap)[2]
+            if not task.recursive or len(self._heap) >= self.target_tasks:
+                return task
+
+        split = self._split(task)
+        if split is None:
+            return task  # Unreadable here; let the worker try (and report) it
+        files, subdirs = split
+        with self._lock:
+            self.splits += 1
+            if not self._closed:
+                for subdir in subdirs:
+                    self._push(subdir)
+            self._changed.notify_all()
+        # The files directly in the directory go out now, the subdirectories stay queued
+        return SearchTask(task.path, recursive=False, size=files)
+
+    def task_done(self, unvisited=()):
+        """Reports a task from next_task finished; unvisited directories are queued to be searched recursively"""
+        with self._lock:
+            self._in_progress -= 1
+            if not self._closed:
+                for path in unvisited:
+                    self._push(SearchTask(path, recursive=True))
+            self._changed.notify_all()
+
+    def close(self):
+        """Stops handing out tasks. Returns the ones that were never sent."""
+        with self._lock:
+            self._closed = True
+            remaining = [entry[2] for entry in self._heap]
+            self._heap = []
+            self._changed.notify_all()
+            return remaining
+
+    def _push(self, task):
+        heapq.heappush(self._heap, (-task.size, next(self._order), task))
+
+    @staticmethod
+    def _split(task):
+        """
+        Lists task's directory once (called without the lock).
+
+        Returns:
+            (number of other entries, recursive tasks for its subdirectories), or None if it can't be read
+        """
+        files = 0
+        subdirs = []
+        try:
+            with os.scandir(task.path) as entries:
+                for entry in entries:
+                    # Same as os.walk: symlinked directories aren't followed
+                    if not entry.is_dir(follow_symlinks=False):
+                        files += 1
+                        continue
+                    try:
+                        size = entry.stat(follow_symlinks=False).st_nlink
+                    except OSError:
+                        size = 0
+                    subdirs.append(SearchTask(entry.path, recursive=True, size=size))
+        except OSError:
+            return None
+        return files, subdirs
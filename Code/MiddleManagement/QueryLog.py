@@ -0,0 +1,90 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from logging.handlers import RotatingFileHandler
+from typing import Dict, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+class QueryLog:
+    """
+    Append-only log of the searches served, one JSON line per search, rotated by size.
+    Used on startup to find the queries worth warming the cache with.
+    It holds raw user queries, so it is only kept where it's asked for, and rotation isn't
+    coordinated between processes: give every process writing one its own file.
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=3):
+        """
+        Args:
+            path: Log file; rotated files get .1, .2, ... suffixes
+            max_bytes: Size at which the log is rotated
+            backup_count: Number of rotated files kept
+        """
+        self.path = os.path.expanduser(path)
+        self.backup_count = backup_count
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._handler = RotatingFileHandler(self.path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self._handler.setFormatter(logging.Formatter('%(message)s'))
+        self._lock = threading.Lock()
+
+    def record(self, prompt: str, limit: Optional[int], latency_ms: float, cached: bool) -> None:
+        """
+        Append one search to the log.
+
+        Args:
+            prompt: The search query string
+            limit: Page size it was searched with
+            latency_ms: Time it took to answer
+            cached: Whether it was answered from the cache
+        """
+        line = json.dumps({"ts": time.time(), "prompt": prompt, "limit": limit,
+                           "latency_ms": round(latency_ms, 3), "cached": cached})
+        record = logging.LogRecord(__name__, logging.INFO, self.path, 0, line, None, None)
+        with self._lock:
+            try:
+                self._handler.emit(record)
+            except Exception as e:
+                logger.error(f"Error writing query log: {e}")
+
+    def top_queries(self, n: int) -> List[Tuple[str, Optional[int]]]:
+        """
+        The n most frequent and the n most expensive (total database time) queries, most
+        important first and without duplicates.
+
+        Returns:
+            List of (prompt, limit) pairs
+        """
+        frequency: Dict[Tuple[str, Optional[int]], int] = defaultdict(int)
+        cost: Dict[Tuple[str, Optional[int]], float] = defaultdict(float)
+        for entry in self._read():
+            query = (entry["prompt"], entry.get("limit"))
+            frequency[query] += 1
+            if not entry.get("cached"):
+                cost[query] += entry.get("latency_ms", 0)
+
+        most_frequent = sorted(frequency, key=frequency.get, reverse=True)[:n]
+        most_expensive = sorted(cost, key=cost.get, reverse=True)[:n]
+        # Interleave the two lists so both kinds get warmed early
+        ordered = [q for pair in zip(most_frequent, most_expensive) for q in pair]
+        ordered += most_frequent[len(most_expensive):] + most_expensive[len(most_frequent):]
+        return list(dict.fromkeys(ordered))
+
+    def _read(self):
+        """Yields the logged entries, oldest file first"""
+        paths = [f"{self.path}.{i}" for i in range(self.backup_count, 0, -1)] + [self.path]
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue  # A line cut short by a crash or a rotation
@@ -1,112 +1,335 @@
+import heapq
+import ntpath
+import sys
+from array import array
+from abc import ABC, abstractmethod
+import threading
 import time
-from typing import Dict, List, Tuple, Any
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Any, Optional
 import logging
 
 # Configure logging
-logging.basicConfig(level=logging.INFO, 
+logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-class SearchCache:
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+class CacheBackend(ABC):
+    """
+    Storage behind SearchSelectorProxy. Implementations keep the same semantics:
+    per-entry TTL, bounded size with LRU eviction, scope tags and O(1)-ish stats.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Cached results for key, or None if missing or expired."""
+        pass
+
+    @abstractmethod
+    def set(self, key: str, results: List[Dict[str, Any]], ttl: Optional[float] = None,
+            scope: Optional[List[str]] = None) -> None:
+        """Store results for key."""
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Clear all cached entries."""
+        pass
+
+    @abstractmethod
+    def remove(self, key: str) -> None:
+        """Remove a specific key from the cache."""
+        pass
+
+    @abstractmethod
+    def invalidate_root(self, root: Optional[str]) -> int:
+        """Remove the entries that may depend on files under root. Returns how many were removed."""
+        pass
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Cache statistics."""
+        pass
+
+    def export_entries(self) -> List[Dict[str, Any]]:
+        """Live entries, for a snapshot on disk. Backends that persist by themselves return nothing."""
+        return []
+
+    def import_entries(self, entries: List[Dict[str, Any]]) -> int:
+        """Restores entries from export_entries. Returns how many were restored."""
+        return 0
+
+    @staticmethod
+    def _normalize_path(path: str) -> str:
+        """Same normalization as the path search: forward slashes, lowercase"""
+        return path.replace('\\', '/').lower().rstrip('/')
+
+    @staticmethod
+    def _format_bytes(size_bytes: int) -> str:
+        if size_bytes < 1024:
+            return f"{size_bytes} bytes"
+        elif size_bytes < 1024 * 1024:
+            return f"{size_bytes / 1024:.2f} KB"
+        else:
+            return f"{size_bytes / (1024 * 1024):.2f} MB"
+
+
+class PackedResults:
+    """
+    Database search results stored column-wise: file ids in an array of 64-bit ints, paths and
+    cursors in tuples, and no per-row dicts. Filenames aren't stored, they're the last path component.
+    Rows are only turned back into dicts when the results are read (the page being rendered).
+    """
+    __slots__ = ('ids', 'paths', 'cursors')
+
+    FIELDS = {'id', 'filename', 'path', 'cursor'}
+
+    def __init__(self, ids: array, paths: Tuple[str, ...], cursors: Tuple[str, ...]):
+        self.ids = ids
+        self.paths = paths
+        self.cursors = cursors
+
+    @classmethod
+    def pack(cls, results: List[Dict[str, Any]]) -> Optional["PackedResults"]:
+        """Packs rows from the database strategies; None if they don't all have that shape."""
+        for result in results:
+            if (result.keys() != cls.FIELDS or not isinstance(result['id'], int)
+                    or result['filename'] != ntpath.basename(result['path'])):
+                return None
+        return cls(array('q', (r['id'] for r in results)),
+                   tuple(r['path'] for r in results),
+                   tuple(r['cursor'] for r in results))
+
+    def unpack(self) -> List[Dict[str, Any]]:
+        return [{"id": file_id, "filename": ntpath.basename(path), "path": path, "cursor": cursor}
+                for file_id, path, cursor in zip(self.ids, self.paths, self.cursors)]
+
+    def size(self) -> int:
+        """Rough size in bytes"""
+        return (sys.getsizeof(self) + sys.getsizeof(self.ids) + sys.getsizeof(self.paths)
+                + sys.getsizeof(self.cursors) + sum(map(sys.getsizeof, self.paths))
+                + sum(map(sys.getsizeof, self.cursors)))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class SearchCache(CacheBackend):
     """
-    A cache for storing search results to avoid repeated database queries.
+    A cache for storing search results to avoid repeated database queries (in this process' memory).
+    Bounded by entry count and by an estimated byte budget; the least recently used
+    entries are evicted first. Expired entries are swept a few at a time on every write,
+    and statistics are kept as running counters so reading them is O(1).
     """
-    
-    def __init__(self, expiry_time=600):  # Default expiry time: 10 minutes
+
+    def __init__(self, expiry_time=600, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):  # Default expiry time: 10 minutes
         """
         Initialize the search cache.
-        
+
         Args:
             expiry_time: Time in seconds before a cache entry expires
+            max_entries: Maximum number of cached queries
+            max_bytes: Rough memory budget for the cached results
         """
-        self.cache: Dict[str, Tuple[List[Dict[str, Any]], float]] = {}
+        # key -> (results or PackedResults, expires_at, size in bytes), least recently used first
+        self.cache: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
         self.expiry_time = expiry_time
-        logger.info("Search cache initialized with expiry time: %s seconds", expiry_time)
-    
-    def get(self, key: str) -> List[Dict[str, Any]]:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._expiry_heap: List[Tuple[float, str]] = []  # (expires_at, key), may hold stale pairs
+        # Path prefixes each scoped entry is limited to; entries missing here may depend on any path
+        self._scopes: Dict[str, List[str]] = {}
+        self._lock = threading.RLock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        logger.info("Search cache initialized with expiry time: %s seconds, max %s entries / %s bytes",
+                    expiry_time, max_entries, max_bytes)
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
         """
         Retrieve results from cache if they exist and are not expired.
-        
+
         Args:
             key: The cache key (typically the search query)
-            
+
         Returns:
             The cached results or None if not in cache or expired
         """
-        if key in self.cache:
-            results, timestamp = self.cache[key]
-            if time.time() - timestamp < self.expiry_time:
-                logger.debug("Cache hit for query: '%s'", key)
-                return results
-            else:
-                logger.debug("Cache expired for query: '%s'", key)
-                del self.cache[key]
-        
-        logger.debug("Cache miss for query: '%s'", key)
-        return None
-    
-    def set(self, key: str, results: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            entry = self.cache.get(key)
+            if entry is not None:
+                results, expires_at, _ = entry
+                if time.time() < expires_at:
+                    self.cache.move_to_end(key)
+                    self._hits += 1
+                    logger.debug("Cache hit for query: '%s'", key)
+                    return results.unpack() if isinstance(results, PackedResults) else results
+                else:
+                    logger.debug("Cache expired for query: '%s'", key)
+                    self._drop(key)
+                    self._expirations += 1
+
+            self._misses += 1
+            logger.debug("Cache miss for query: '%s'", key)
+            return None
+
+    def set(self, key: str, results: List[Dict[str, Any]], ttl: Optional[float] = None,
+            scope: Optional[List[str]] = None) -> None:
         """
         Store results in the cache.
-        
+
         Args:
             key: The cache key (typically the search query)
             results: The search results to cache
+            ttl: Lifetime of this entry in seconds (defaults to expiry_time)
+            scope: Path prefixes the query is limited to (None if it may match anywhere)
         """
-        self.cache[key] = (results, time.time())
+        packed = PackedResults.pack(results)
+        stored = packed if packed is not None else results
+        size = self._estimate_size(key, stored)
+        if size > self.max_bytes:
+            logger.debug("Not caching query: '%s' (%d bytes is over the budget)", key, size)
+            return
+
+        expires_at = time.time() + (self.expiry_time if ttl is None else ttl)
+        with self._lock:
+            if key in self.cache:
+                self._drop(key)
+            self.cache[key] = (stored, expires_at, size)
+            self._bytes += size
+            if scope:
+                self._scopes[key] = [self._normalize_path(p) for p in scope]
+            heapq.heappush(self._expiry_heap, (expires_at, key))
+
+            self._sweep_expired()
+            while len(self.cache) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self.cache)))
+                self._evictions += 1
         logger.debug("Cached results for query: '%s' (%d results)", key, len(results))
-    
+
     def clear(self) -> None:
         """Clear all cached entries."""
-        self.cache.clear()
+        with self._lock:
+            self.cache.clear()
+            self._expiry_heap.clear()
+            self._scopes.clear()
+            self._bytes = 0
         logger.info("Cache cleared")
-    
+
     def remove(self, key: str) -> None:
         """
         Remove a specific key from the cache.
-        
+
         Args:
             key: The cache key to remove
         """
-        if key in self.cache:
-            del self.cache[key]
-            logger.debug("Removed cache entry for: '%s'", key)
-    
+        with self._lock:
+            if key in self.cache:
+                self._drop(key)
+                logger.debug("Removed cache entry for: '%s'", key)
+
+    def invalidate_root(self, root: Optional[str]) -> int:
+        """
+        Remove the entries whose results may change when files under root change:
+        every unscoped entry, and scoped entries whose prefixes overlap root.
+
+        Args:
+            root: Directory that changed (None means anything may have changed)
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock:
+            if root is None:
+                count = len(self.cache)
+                self.clear()
+                return count
+
+            root = self._normalize_path(root)
+            stale = [key for key in self.cache
+                     if key not in self._scopes
+                     or any(root.startswith(p) or p.startswith(root) for p in self._scopes[key])]
+            for key in stale:
+                self._drop(key)
+            return len(stale)
+
+    def export_entries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._sweep_expired()
+            now = time.time()
+            return [{"key": key, "ttl": expires_at - now,
+                     "results": results.unpack() if isinstance(results, PackedResults) else results,
+                     "scope": self._scopes.get(key)}
+                    for key, (results, expires_at, _) in self.cache.items()]
+
+    def import_entries(self, entries: List[Dict[str, Any]]) -> int:
+        restored = 0
+        for entry in entries:  # Least recently used first, so the LRU order survives
+            if entry["ttl"] > 0:
+                self.set(entry["key"], entry["results"], ttl=entry["ttl"],
+                         scope=entry.get("scope"))
+                restored += 1
+        return restored
+
     def stats(self) -> Dict[str, Any]:
         """
         Get cache statistics.
-        
+
         Returns:
             Dictionary with cache statistics
         """
-        current_time = time.time()
-        active_entries = sum(1 for _, timestamp in self.cache.values() 
-                            if current_time - timestamp < self.expiry_time)
-        
-        return {
-            "total_entries": len(self.cache),
-            "active_entries": active_entries,
-            "expired_entries": len(self.cache) - active_entries,
-            "memory_usage_estimate": self._estimate_memory_usage()
-        }
-    
-    def _estimate_memory_usage(self) -> str:
-        """Rough estimate of memory usage by the cache."""
-        # This is a very rough estimate
-        import sys
-        try:
-            size_bytes = sys.getsizeof(self.cache)
-            for key, (results, _) in self.cache.items():
-                size_bytes += sys.getsizeof(key)
-                size_bytes += sys.getsizeof(results)
-                for result in results:
-                    size_bytes += sys.getsizeof(result)
-            
-            if size_bytes < 1024:
-                return f"{size_bytes} bytes"
-            elif size_bytes < 1024 * 1024:
-                return f"{size_bytes / 1024:.2f} KB"
-            else:
-                return f"{size_bytes / (1024 * 1024):.2f} MB"
-        except:
-            return "Unknown"
\ No newline at end of file
+        with self._lock:
+            self._sweep_expired()
+            lookups = self._hits + self._misses
+            return {
+                "total_entries": len(self.cache),
+                "active_entries": len(self.cache),
+                "expired_entries": self._expirations,
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "memory_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "memory_usage_estimate": self._format_bytes(self._bytes)
+            }
+
+    def _drop(self, key: str) -> None:
+        """Removes an entry and its size from the running total (its heap pair goes stale)."""
+        _, _, size = self.cache.pop(key)
+        self._bytes -= size
+        self._scopes.pop(key, None)
+
+    def _sweep_expired(self) -> None:
+        """Pops expired entries off the expiry heap; only pays for entries that actually expired."""
+        now = time.time()
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry_heap)
+            entry = self.cache.get(key)
+            # Skip pairs left behind by entries that were replaced or removed since
+            if entry is not None and entry[1] == expires_at:
+                self._drop(key)
+                self._expirations += 1
+        # Stale pairs only pile up on replaced keys; rebuild if they outnumber live entries
+        if len(self._expiry_heap) > 2 * len(self.cache) + 64:
+            self._expiry_heap = [(entry[1], key) for key, entry in self.cache.items()]
+            heapq.heapify(self._expiry_heap)
+
+    @staticmethod
+    def _estimate_size(key: str, results) -> int:
+        """Rough size of an entry, computed once when it is stored."""
+        if isinstance(results, PackedResults):
+            return sys.getsizeof(key) + results.size()
+        size = sys.getsizeof(key) + sys.getsizeof(results)
+        for result in results:
+            size += sys.getsizeof(result)
+            for value in result.values():
+                size += sys.getsizeof(value)
+        return size
@@ -1,7 +1,8 @@
 from collections import defaultdict
+import os
 import re
 import logging
-from typing import Dict
+from typing import Dict, List, Optional, Tuple, Any
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
@@ -13,21 +14,128 @@ class SearchSelector:
     def __init__(self, db):
         self.db = db
     
-    def search_prompt(self, prompt: str) -> list:
+    def search_prompt(self, prompt: str, limit: Optional[int] = None, cursor: Optional[str] = None,
+                      within: Optional[str] = None) -> list:
         """
         Process a search prompt and return matching results.
         
         Args:
             prompt: Search query string
+            limit: Maximum number of results (None for all of them)
+            cursor: Resume after the result carrying this cursor (None for the first page)
+            within: Only return files below this absolute directory
             
         Returns:
             List of search results
         """
         logger.info(f"Received search prompt: '{prompt}'")
-        
+        strategy_name, argument = self._plan(prompt, within)
+        if strategy_name is None:
+            return []
+
+        results = self.db.search(strategy_name, argument, limit=limit, cursor=cursor)
+        logger.info(f"Search completed with {len(results)} results")
+        return results
+
+    def estimate_count(self, prompt: str) -> Optional[int]:
+        """
+        Cheap estimate of the total number of results for a prompt (None if unknown).
+        """
+        strategy_name, argument = self._plan(prompt)
+        if strategy_name is None:
+            return 0
+        return self.db.estimate_count(strategy_name, argument)
+
+    def explain(self, prompt: str) -> Dict[str, Any]:
+        """
+        Which strategy answers a prompt and which tables its plan scans sequentially.
+        """
+        strategy_name, argument = self._plan(prompt)
+        if strategy_name is None:
+            return {"strategy": None, "seq_scans": []}
+        return {"strategy": strategy_name, "seq_scans": self.db.find_seq_scans(strategy_name, argument)}
+
+    def scope(self, prompt: str, within: Optional[str] = None) -> Optional[List[str]]:
+        """
+        Absolute path prefixes a prompt's results are limited to, or None if they may come from anywhere.
+        Used to tell which cached results a change under some directory can affect.
+        """
+        if within:
+            return [within]
+        parsed_query, _ = self._parse_query(prompt)
+        prefixes = [p for p in parsed_query.get('path', [])
+                    if p.startswith(('/', '\\')) or re.match(r'^[a-zA-Z]:[\\/]', p)]
+        return prefixes or None
+
+    def indexless_query(self, prompt: str) -> Optional[Dict[str, Any]]:
+        """
+        The closest indexless (filesystem scan) equivalent of a prompt, used by hybrid search
+        for the parts of the tree the index doesn't cover yet.
+
+        Returns:
+            {"query", "mode", "words", "extensions", "path_terms"}: query and mode are sent to the scan
+            ("filename" or "content"); a live match must also contain every word in its filename, have
+            every extension (the index ANDs them too) and contain every path term in its path.
+            None if the prompt can't be answered by a scan (nothing to search, or several content qualifiers).
+        """
+        strategy_name, argument = self._plan(prompt)
+        if strategy_name is None:
+            return None
+        query = {"query": "", "mode": "filename", "words": [], "extensions": [], "path_terms": []}
+
+        if strategy_name == 'extension':
+            query["query"] = f".{argument}"
+            query["extensions"] = [argument.lower()]
+        elif strategy_name == 'content':
+            # The index also matches on contents; a scan by name is what stays fast
+            query["query"] = argument
+        elif strategy_name == 'multi_word':
+            # Scans take one substring: the longest word narrows the most, the others filter
+            query["query"] = max(argument, key=len)
+            query["words"] = [word.lower() for word in argument]
+        else:
+            if len(argument.get('content', [])) > 1:
+                return None
+            if argument.get('content'):
+                query["query"] = argument['content'][0]
+                query["mode"] = "content"
+            query["extensions"] = [e.lstrip('.').lower() for e in argument.get('extension', [])]
+            if not argument.get('content') and query["extensions"]:
+                query["query"] = f".{query['extensions'][0]}"
+            # Absolute paths are where the scan starts (see scope), the others must appear in the path
+            query["path_terms"] = [p.replace('\\', '/').lower() for p in argument.get('path', [])
+                                   if not (p.startswith(('/', '\\')) or re.match(r'^[a-zA-Z]:[\\/]', p))]
+        return query
+
+    def _plan(self, prompt: str, within: Optional[str] = None) -> Tuple[Optional[str], Any]:
+        """
+        Decide which search strategy answers a prompt.
+        With within, the plan becomes a qualified query with that directory as an extra path: prefix,
+        so the database only returns rows below it.
+
+        Returns:
+            (strategy name, argument for it), or (None, None) if there is nothing to search
+        """
+        strategy_name, argument = self._plan_prompt(prompt)
+        if strategy_name is None or not within:
+            return strategy_name, argument
+
+        if strategy_name == 'qualified':
+            scoped = dict(argument)
+        elif strategy_name == 'extension':
+            scoped = {'extension': [argument]}
+        elif strategy_name == 'multi_word':
+            scoped = {'content': list(argument)}  # Qualifiers are ANDed, like the words
+        else:
+            scoped = {'content': [argument]}
+        # The trailing separator keeps /a/b from matching /a/bc
+        scoped['path'] = list(scoped.get('path', [])) + [os.path.join(within, '')]
+        return 'qualified', scoped
+
+    def _plan_prompt(self, prompt: str) -> Tuple[Optional[str], Any]:
         if not prompt or prompt.strip() == '':
             logger.info("Empty search prompt, returning empty results")
-            return []
+            return None, None
             
         # First we try to parse whatever we can based on iteration 2 criteria
         parsed_query, remaining_text = self._parse_query(prompt)
@@ -39,38 +147,41 @@ class SearchSelector:
             # If we just shove it in the other methods, we'll get a lot of unwanted results.
         if parsed_query:
             logger.info(f"Using parsed query: {parsed_query}")
-            return self._handle_parsed_items(parsed_query)
+            supported_query = self._handle_parsed_items(parsed_query)
+            if not supported_query:
+                return None, None
+            return 'qualified', supported_query
         
         # Iteration 1 of project methods of searching from now on
         else:
             if remaining_text.startswith('.'):
                 extension = remaining_text[1:]  # Remove the dot
                 logger.info(f"Searching by file extension: '{extension}'")
-                return self.db.search_by_extension(extension)
+                return 'extension', extension
         
             if len(remaining_text.split()) > 1:
                 search_words = remaining_text.split()
                 logger.info(f"Searching multiple words: {search_words}")
-                return self.db.search_multi_words(search_words)
+                return 'multi_word', search_words
           
             else:
                 logger.info(f"Searching by content: '{remaining_text}'")
-                return self.db.search_by_content(remaining_text)
+                return 'content', remaining_text
 
 
     def _handle_parsed_items(self, parsed_query):
         """
-        Process parsed query items and return search results based on qualifiers (path, content etc.).
+        Keep the qualifiers (path, content etc.) we know how to search by.
         
         Args:
             parsed_query: Dictionary with query qualifiers as keys and their values as lists
             
         Returns:
-            List of search results
+            The supported part of parsed_query (empty if there is none)
         """
         if not parsed_query:
             logger.info("Empty parsed query, returning empty results")
-            return []
+            return {}
         
         supported_qualifiers = {'path', 'content', 'extension'}
         used_qualifiers = set(parsed_query.keys())
@@ -79,50 +190,13 @@ class SearchSelector:
             unsupported = used_qualifiers - supported_qualifiers
             logger.warning(f"Ignoring unsupported qualifiers: {unsupported}")
         
-        results = None
-        
-        # Process each qualifier type and progressively filter results (it's still AND)
-        if 'path' in parsed_query:
-            for path in parsed_query['path']:
-                logger.debug(f"Filtering by path: '{path}'")
-                path_results = self.db.search_by_path(path)
-                results = self._filter_results(results, path_results)
-                if not results:
-                    logger.info("No results match path criteria")
-                    return []
-        
-        if 'content' in parsed_query:
-            for content in parsed_query['content']:
-                logger.debug(f"Filtering by content: '{content}'")
-                content_results = self.db.search_by_content(content)
-                results = self._filter_results(results, content_results)
-                if not results:
-                    logger.info("No results match content criteria")
-                    return []
-                
-        if 'extension' in parsed_query:
-            for extension in parsed_query['extension']:
-                logger.debug(f"Filtering by extension: '{extension}'")
-                extension_results = self.db.search_by_extension(extension)
-                results = self._filter_results(results, extension_results)
-                if not results:
-                    logger.info("No results match extension criteria")
-                    return []
-                
+        # All qualifiers are compiled into a single statement (every value is ANDed),
+        # so the database only returns the rows matching all of them
         # TODO: Add more criteria
-            
-        logger.info(f"Search completed with {len(results) if results else 0} results")
-        return results or []
-        
-    def _filter_results(self, current_results, new_results):
-        """Helper method to filter results based on previous results"""
-        if current_results is None:
-            return new_results
-            
-        new_dict = {result['path']: result for result in new_results}
-        filtered = [result for result in current_results if result['path'] in new_dict]
-        logger.debug(f"Filtered from {len(current_results)} to {len(filtered)} results")
-        return filtered
+        supported_query = {q: parsed_query[q] for q in ('path', 'content', 'extension') if q in parsed_query}
+        if not supported_query:
+            logger.info("No supported qualifiers, returning empty results")
+        return supported_query
 
     def _parse_query(self, query: str) -> tuple[Dict[str, str], str]:
         """
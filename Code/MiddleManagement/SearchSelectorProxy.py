@@ -1,37 +1,78 @@
+import gzip
+import json
 import logging
-from typing import Dict, List, Any
+import os
+import threading
+import time
+from typing import Dict, List, Any, Optional
 from .SearchSelector import SearchSelector
-from .SearchCache import SearchCache
+from .QueryLog import QueryLog
+from .SearchCache import CacheBackend, SearchCache, DEFAULT_MAX_ENTRIES, DEFAULT_MAX_BYTES
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class _InFlightSearch:
+    """A search currently running against the database, shared by every request waiting for it."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.results: List[Dict[str, Any]] = []
+        self.error: Optional[Exception] = None
+
+
 class SearchSelectorProxy:
     """
     A proxy for SearchSelector that adds caching functionality.
     Implements the Proxy design pattern to transparently add caching.
+    Concurrent misses for the same query are coalesced into one search (single-flight),
+    and queries with no results are cached too, for a shorter time.
     """
     
-    def __init__(self, real_selector: SearchSelector, cache_expiry=600):
+    def __init__(self, real_selector: SearchSelector, cache_expiry=600,
+                 cache_max_entries=DEFAULT_MAX_ENTRIES, cache_max_bytes=DEFAULT_MAX_BYTES,
+                 negative_cache_expiry=30, cache: Optional[CacheBackend] = None,
+                 query_log: Optional[QueryLog] = None, generation: int = 0):
         """
         Initialize the proxy with the real search selector and a cache.
         
         Args:
             real_selector: The actual SearchSelector instance to proxy
             cache_expiry: Time in seconds before cache entries expire(default 600)
+            cache_max_entries: Maximum number of cached queries
+            cache_max_bytes: Rough memory budget of the cache
+            negative_cache_expiry: Time in seconds empty results stay cached (default 30)
+            cache: Cache backend to use (e.g. a SharedSearchCache); by default an in-memory
+                   SearchCache built from the cache_* arguments
+            query_log: Where served searches are recorded, for warming the cache on startup
+            generation: Current index generation (FileManager.get_generation)
         """
         self.real_selector = real_selector
-        self.cache = SearchCache(expiry_time=cache_expiry)
+        self.cache = cache or SearchCache(expiry_time=cache_expiry, max_entries=cache_max_entries,
+                                          max_bytes=cache_max_bytes)
+        self.negative_cache_expiry = negative_cache_expiry
+        # Last index generation we heard of; results computed across a change aren't cached
+        self.generation = generation
+        self._in_flight: Dict[str, _InFlightSearch] = {}
+        self._in_flight_lock = threading.Lock()
+        self._coalesced = 0
+        self.query_log = query_log
+        self._warming = threading.local()  # Searches replayed by warm_up aren't logged again
         logger.info("SearchSelectorProxy initialized with cache expiry: %s seconds", cache_expiry)
     
-    def search_prompt(self, prompt: str) -> List[Dict[str, Any]]:
+    def search_prompt(self, prompt: str, limit: Optional[int] = None,
+                      cursor: Optional[str] = None, within: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Search with caching. Checks cache first before forwarding to real selector.
+        Each page (limit, cursor) is cached on its own.
         
         Args:
             prompt: The search query string
+            limit: Maximum number of results (None for all of them)
+            cursor: Resume after the result carrying this cursor
+            within: Only return files below this absolute directory
             
         Returns:
             List of search results
@@ -42,23 +83,156 @@ class SearchSelectorProxy:
         
         # Normalize the prompt to ensure consistent cache keys
         normalized_prompt = prompt.strip().lower()
+        if limit is not None or cursor:
+            normalized_prompt = f"{normalized_prompt}|{limit}|{cursor or ''}"
+        if within:
+            normalized_prompt = f"{normalized_prompt}|within:{within}"
         
-        # Try to get results from cache
-        cached_results = self.cache.get(normalized_prompt)
+        started = time.perf_counter()
+
+        # Try to get results from cache; a cache that can't be read (e.g. a busy shared file) is a miss
+        try:
+            cached_results = self.cache.get(normalized_prompt)
+        except Exception as e:
+            logger.warning("Search cache lookup failed for query: '%s': %s", prompt, e)
+            cached_results = None
         if cached_results is not None:
             logger.info("Returning cached results for query: '%s'", prompt)
+            self._log_query(prompt, limit, cursor, within, started, cached=True)
             return cached_results
         
+        # If someone is already searching for this, wait for their results instead
+        with self._in_flight_lock:
+            flight = self._in_flight.get(normalized_prompt)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[normalized_prompt] = _InFlightSearch()
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            logger.info("Waiting for in-flight search for query: '%s'", prompt)
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            self._log_query(prompt, limit, cursor, within, started, cached=True)
+            return flight.results
+
         # If not in cache, forward to real selector
         logger.info("Cache miss for query: '%s', forwarding to real selector", prompt)
-        results = self.real_selector.search_prompt(prompt)
-        
-        # Cache the results if there are any
-        if results:
-            self.cache.set(normalized_prompt, results)
-        
-        return results
+        try:
+            generation = self.generation
+            results = self.real_selector.search_prompt(prompt, limit=limit, cursor=cursor, within=within)
+
+            # Cache the results (empty ones for a shorter time), unless the index changed while we were searching
+            if generation == self.generation:
+                try:
+                    self.cache.set(normalized_prompt, results,
+                                   ttl=None if results else self.negative_cache_expiry,
+                                   scope=self.real_selector.scope(prompt, within))
+                except Exception as e:
+                    logger.warning("Could not cache results for query: '%s': %s", prompt, e)
+            flight.results = results
+            self._log_query(prompt, limit, cursor, within, started, cached=False)
+            return results
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[normalized_prompt]
+            flight.done.set()
     
+    def warm_up(self, top_n: int) -> int:
+        """
+        Replays the most frequent and most expensive logged queries so they're cached
+        before users ask for them. Meant to run in a background thread on startup.
+
+        Returns:
+            Number of queries replayed
+        """
+        if not self.query_log or top_n <= 0:
+            return 0
+        queries = self.query_log.top_queries(top_n)
+        logger.info("Warming search cache with %d logged queries", len(queries))
+        self._warming.active = True
+        try:
+            for prompt, limit in queries:
+                try:
+                    self.search_prompt(prompt, limit=limit)
+                except Exception as e:
+                    logger.warning("Warm-up search failed for query: '%s': %s", prompt, e)
+        finally:
+            self._warming.active = False
+        logger.info("Search cache warm-up done")
+        return len(queries)
+
+    def save_snapshot(self, path: str) -> int:
+        """
+        Writes the cache contents to disk, tagged with the current index generation.
+        The file is created readable by the current user only.
+
+        Returns:
+            Number of entries saved
+        """
+        entries = self.cache.export_entries()
+        if not entries:
+            return 0
+        path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(path) or '.', mode=0o700, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+            json.dump({"generation": self.generation, "entries": entries}, f, default=str)
+        logger.info("Saved %d cache entries to %s", len(entries), path)
+        return len(entries)
+
+    def load_snapshot(self, path: str) -> int:
+        """
+        Restores a snapshot from save_snapshot, but only if the index hasn't changed since
+        (same generation); otherwise the snapshot is stale and ignored.
+
+        Returns:
+            Number of entries restored
+        """
+        path = os.path.expanduser(path)
+        if not os.path.exists(path):
+            return 0
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except Exception as e:
+            logger.warning("Could not read cache snapshot %s: %s", path, e)
+            return 0
+        if snapshot.get("generation") != self.generation:
+            logger.info("Ignoring cache snapshot from index generation %s (current: %s)",
+                        snapshot.get("generation"), self.generation)
+            return 0
+        restored = self.cache.import_entries(snapshot.get("entries", []))
+        logger.info("Restored %d cache entries from %s", restored, path)
+        return restored
+
+    def estimate_count(self, prompt: str) -> Optional[int]:
+        """Cheap estimate of the total number of results (not cached)."""
+        return self.real_selector.estimate_count(prompt)
+
+    def explain(self, prompt: str) -> Dict[str, Any]:
+        """Plan check for a prompt (not cached)."""
+        return self.real_selector.explain(prompt)
+
+    def scope(self, prompt: str, within: Optional[str] = None) -> Optional[List[str]]:
+        """Path prefixes a prompt's results are limited to (not cached)."""
+        return self.real_selector.scope(prompt, within)
+
+    def indexless_query(self, prompt: str) -> Optional[Dict[str, Any]]:
+        """Indexless equivalent of a prompt, for hybrid search (not cached)."""
+        return self.real_selector.indexless_query(prompt)
+
+    def _log_query(self, prompt: str, limit: Optional[int], cursor: Optional[str], within: Optional[str],
+                   started: float, cached: bool) -> None:
+        # Only unscoped first pages are worth replaying; the log doesn't keep cursors or directories
+        if self.query_log and not cursor and not within and not getattr(self._warming, "active", False):
+            self.query_log.record(prompt, limit, (time.perf_counter() - started) * 1000, cached)
+
     def clear_cache(self) -> None:
         """Clear the entire cache."""
         self.cache.clear()
@@ -70,11 +244,25 @@ class SearchSelectorProxy:
         Returns:
             Dictionary with cache statistics
         """
-        return self.cache.stats()
+        stats = self.cache.stats()
+        stats["coalesced_requests"] = self._coalesced
+        return stats
     
-    def invalidate_cache(self) -> None:
+    def invalidate_cache(self, root: Optional[str] = None) -> None:
         """
         Invalidate the cache. Used when files are indexed or modified.
+        
+        Args:
+            root: Directory that changed; only entries that may depend on it are dropped.
+                  None drops everything.
+        """
+        logger.info("Invalidating search cache due to file system changes under: %s", root or "any path")
+        removed = self.cache.invalidate_root(root)
+        logger.info("Invalidated %d cache entries", removed)
+
+    def on_index_changed(self, root: Optional[str], generation: int) -> None:
+        """
+        Listener for FileManager: the index moved to a new generation because files under root changed.
         """
-        logger.info("Invalidating search cache due to file system changes")
-        self.clear_cache()
\ No newline at end of file
+        self.generation = max(self.generation, generation)
+        self.invalidate_cache(root)
\ No newline at end of file
@@ -0,0 +1,227 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, Any, Optional
+import logging
+
+from .SearchCache import CacheBackend, DEFAULT_MAX_ENTRIES, DEFAULT_MAX_BYTES
+
+# Configure logging
+logging.basicConfig(level=logging.INFO,
+                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Private to the user: cached results reveal what was searched and where files are
+DEFAULT_PATH = os.path.join(os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+                            "local-search-engine", "cache.sqlite3")
+FLUSH_INTERVAL = 1.0  # seconds between writes of this process' counters and last-used times
+
+class SharedSearchCache(CacheBackend):
+    """
+    A search cache stored in a SQLite file on local disk, so every worker process on the
+    machine shares the same entries (one warm cache instead of one cold cache per worker).
+    Results are stored as zlib-compressed JSON. Same semantics as SearchCache: per-entry TTL,
+    LRU eviction by entry count and byte budget, scope tags.
+    Hit/miss/eviction counters are summed across processes. Hits don't write: their last-used
+    times are batched with the counters, so eviction order lags by up to a second.
+    The file and its directory are created readable by the current user only.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, expiry_time=600, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            path: SQLite file shared by the workers
+            expiry_time: Time in seconds before a cache entry expires
+            max_entries: Maximum number of cached queries
+            max_bytes: Budget for the compressed payloads
+        """
+        self.path = os.path.expanduser(path)
+        self.expiry_time = expiry_time
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()  # sqlite3 connections can't be shared between threads
+        self._counter_lock = threading.Lock()
+        self._pending = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        self._touched: Dict[str, float] = {}  # key -> last hit, not written yet
+        self._last_flush = time.monotonic()
+        self._create_file()
+        self._create_schema()
+        logger.info("Shared search cache at %s, expiry time: %s seconds, max %s entries / %s bytes",
+                    self.path, expiry_time, max_entries, max_bytes)
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute("SELECT payload, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            payload, expires_at = row
+            if now < expires_at:
+                with self._counter_lock:
+                    self._touched[key] = now
+                self._count("hits")
+                logger.debug("Cache hit for query: '%s'", key)
+                return json.loads(zlib.decompress(payload))
+            with conn:
+                conn.execute("DELETE FROM entries WHERE key = ? AND expires_at = ?", (key, expires_at))
+            self._count("expirations")
+
+        self._count("misses")
+        logger.debug("Cache miss for query: '%s'", key)
+        return None
+
+    def set(self, key: str, results: List[Dict[str, Any]], ttl: Optional[float] = None,
+            scope: Optional[List[str]] = None) -> None:
+        payload = zlib.compress(json.dumps(results, separators=(',', ':'), default=str).encode())
+        if len(payload) > self.max_bytes:
+            logger.debug("Not caching query: '%s' (%d bytes is over the budget)", key, len(payload))
+            return
+
+        now = time.time()
+        expires_at = now + (self.expiry_time if ttl is None else ttl)
+        scope_json = json.dumps([self._normalize_path(p) for p in scope]) if scope else None
+        conn = self._conn()
+        with conn:
+            conn.execute("""
+                INSERT OR REPLACE INTO entries (key, payload, size, expires_at, last_used, scope)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (key, payload, len(payload), expires_at, now, scope_json))
+            expired = conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,)).rowcount
+            # Least recently used first: whatever is past the entry count or the byte budget goes
+            evicted = conn.execute("""
+                DELETE FROM entries WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key,
+                               ROW_NUMBER() OVER (ORDER BY last_used DESC) AS position,
+                               SUM(size) OVER (ORDER BY last_used DESC ROWS UNBOUNDED PRECEDING) AS running_size
+                        FROM entries
+                    ) WHERE position > ? OR running_size > ?
+                )
+            """, (self.max_entries, self.max_bytes)).rowcount
+        self._count("expirations", expired)
+        self._count("evictions", evicted)
+        logger.debug("Cached results for query: '%s' (%d results)", key, len(results))
+
+    def clear(self) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM entries")
+        logger.info("Cache cleared")
+
+    def remove(self, key: str) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def invalidate_root(self, root: Optional[str]) -> int:
+        conn = self._conn()
+        with conn:
+            if root is None:
+                return conn.execute("DELETE FROM entries").rowcount
+            root = self._normalize_path(root)
+            return conn.execute("""
+                DELETE FROM entries
+                WHERE scope IS NULL OR EXISTS (
+                    SELECT 1 FROM json_each(entries.scope) AS prefix
+                    WHERE substr(?1, 1, length(prefix.value)) = prefix.value
+                       OR substr(prefix.value, 1, length(?1)) = ?1
+                )
+            """, (root,)).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        self._flush(force=True)
+        now = time.time()
+        total, active, size = conn.execute("""
+            SELECT COUNT(*), COALESCE(SUM(expires_at > ?), 0), COALESCE(SUM(size), 0) FROM entries
+        """, (now,)).fetchone()
+        counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "backend": "sqlite",
+            "total_entries": total,
+            "active_entries": active,
+            "expired_entries": counters.get("expirations", 0),
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": counters.get("evictions", 0),
+            "memory_bytes": size,
+            "max_bytes": self.max_bytes,
+            "memory_usage_estimate": self._format_bytes(size)
+        }
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")  # Readers don't block the writer
+            conn.execute("PRAGMA synchronous=NORMAL")  # It's a cache; losing the last writes on a crash is fine
+            self._local.conn = conn
+        return conn
+
+    def _create_file(self) -> None:
+        """Creates the directory (0700) and the database file (0600) if they don't exist yet"""
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        os.close(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600))
+
+    def _create_schema(self) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    payload BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    scope TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_expires_at ON entries(expires_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries(last_used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        """Counters are kept in memory and written to the shared file at most once a second."""
+        if amount <= 0:
+            return
+        with self._counter_lock:
+            self._pending[name] += amount
+        self._flush()
+
+    def _flush(self, force: bool = False) -> None:
+        """Writes the pending counters and last-used times; if the file is busy they wait for the next flush."""
+        with self._counter_lock:
+            if not force and time.monotonic() - self._last_flush < FLUSH_INTERVAL:
+                return
+            pending = {name: value for name, value in self._pending.items() if value}
+            touched = self._touched
+            self._pending = dict.fromkeys(self._pending, 0)
+            self._touched = {}
+            self._last_flush = time.monotonic()
+        if not pending and not touched:
+            return
+        try:
+            conn = self._conn()
+            with conn:
+                conn.executemany("""
+                    INSERT INTO counters (name, value) VALUES (?, ?)
+                    ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+                """, pending.items())
+                conn.executemany("UPDATE entries SET last_used = MAX(last_used, ?) WHERE key = ?",
+                                 [(used, key) for key, used in touched.items()])
+        except sqlite3.Error as e:
+            logger.warning("Could not write cache counters, retrying later: %s", e)
+            with self._counter_lock:
+                for name, value in pending.items():
+                    self._pending[name] += value
+                for key, used in touched.items():
+                    self._touched[key] = max(used, self._touched.get(key, 0))
@@ -0,0 +1,108 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from Code.MiddleManagement.FileIndexer import FileIndexer
+from Code.MiddleManagement.FileWatcher import FileWatcher
+
+
+class InMemoryFileManager:
+    """The part of FileManager the indexer uses, keeping the rows in a dict"""
+
+    def __init__(self):
+        self.rows = {}
+
+    def add_file(self, file_data):
+        self.rows[file_data['path']] = file_data
+        return True
+
+    def add_files(self, files, batch_size=None):
+        for file_data in files:
+            self.add_file(file_data)
+        return True
+
+    def get_file_snapshot(self, root):
+        return {path: (row['size'], row['modified']) for path, row in self.rows.items() if _is_under(path, root)}
+
+    def remove_files_by_path(self, paths, batch_size=None):
+        return sum(self.rows.pop(path, None) is not None for path in paths)
+
+    def purge_missing(self, root, live_paths, keep_roots=()):
+        live = set(live_paths)
+        gone = [path for path in self.rows
+                if _is_under(path, root) and path not in live and not any(_is_under(path, k) for k in keep_roots)]
+        return self.remove_files_by_path(gone)
+
+
+def _is_under(path, root):
+    return path == root or path.startswith(os.path.join(root, ''))
+
+
+class FileWatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = os.path.realpath(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        self.db = InMemoryFileManager()
+        self.indexer = FileIndexer(self.db)
+
+    def _watch(self, backend):
+        watcher = FileWatcher(self.indexer, backend=backend, debounce=0.2, max_delay=2.0, poll_interval=0.1)
+        watcher.watch(self.root)
+        watcher.start()
+        self.addCleanup(watcher.stop)
+        return watcher
+
+    def _wait_until_written(self, watcher, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            changed, removed_dirs = watcher.pending_changes()
+            if not changed and not removed_dirs and watcher.stats()["batches"]:
+                return
+            time.sleep(0.05)
+        self.fail("the watcher didn't write its changes in time")
+
+    def _assert_recreated_directory_indexed(self, backend):
+        build = os.path.join(self.root, "build")
+        os.mkdir(build)
+        with open(os.path.join(build, "old.txt"), "w") as f:
+            f.write("old")
+        self.indexer.index_path(self.root)
+        watcher = self._watch(backend)
+        time.sleep(0.3)  # The polling backend takes its first snapshot
+
+        # Removed and created again within one debounce window
+        shutil.rmtree(build)
+        os.mkdir(build)
+        with open(os.path.join(build, "new.txt"), "w") as f:
+            f.write("new")
+        self._wait_until_written(watcher)
+
+        self.assertIn(os.path.join(build, "new.txt"), self.db.rows)
+        self.assertNotIn(os.path.join(build, "old.txt"), self.db.rows)
+        self.assertEqual(watcher.pending_changes(), (set(), set()))
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is only available on Linux")
+    def test_recreated_directory_is_not_purged_inotify(self):
+        self._assert_recreated_directory_indexed("inotify")
+
+    def test_recreated_directory_is_not_purged_polling(self):
+        self._assert_recreated_directory_indexed("polling")
+
+    def test_index_changes_purges_removed_directories_before_writing(self):
+        build = os.path.join(self.root, "build")
+        os.mkdir(build)
+        with open(os.path.join(build, "new.txt"), "w") as f:
+            f.write("new")
+        self.db.rows[os.path.join(build, "old.txt")] = {"size": 3, "modified": None}
+
+        self.indexer.index_changes([build], removed_dirs=[build])
+
+        self.assertEqual(sorted(self.db.rows), [os.path.join(build, "new.txt")])
+
+
+if __name__ == '__main__':
+    unittest.main()